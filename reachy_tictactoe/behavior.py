@@ -1,29 +1,31 @@
-import time
 import logging
 import numpy as np
 
 from threading import Event, Thread
 from pyquaternion import Quaternion
 
+from .clock import real_clock
+
 
 logger = logging.getLogger('reachy.tictactoe.behavior')
 
 
 class FollowHand(object):
-    def __init__(self, reachy):
+    def __init__(self, reachy, clock=real_clock):
         self.reachy = reachy
+        self.clock = clock
         self.running = Event()
 
     def start(self):
         logger.info('Launching follow hand behavior')
         self.t = Thread(target=self.asserv)
         self.running.set()
-        self.t.start()
+        self.clock.start(self.t)
 
     def stop(self):
         logger.info('Stopping follow hand behavior')
         self.running.clear()
-        self.t.join()
+        self.clock.join(self.t)
 
     def asserv(self):
         while self.running.is_set():
@@ -40,7 +42,7 @@ class FollowHand(object):
             except ValueError:
                 pass
 
-            time.sleep(0.01)
+            self.clock.sleep(0.01, None)
 
 
 def head_home(reachy, duration):
@@ -73,7 +75,7 @@ def sad(reachy):
     logger.info('Ending behavior', extra={'behavior': 'sad'})
 
 
-def happy(reachy):
+def happy(reachy, clock=real_clock):
     logger.info('Starting behavior', extra={'behavior': 'happy'})
 
     q = Quaternion(axis=[1, 0, 0], angle=np.deg2rad(-15))
@@ -86,15 +88,15 @@ def happy(reachy):
     for p in pos:
         reachy.head.left_antenna.goal_position = p
         reachy.head.right_antenna.goal_position = -p
-        time.sleep(0.01)
+        clock.sleep(0.01, 'animation')
 
-    time.sleep(1)
+    clock.sleep(1, 'behavior')
     head_home(reachy, duration=1)
 
     logger.info('Ending behavior', extra={'behavior': 'happy'})
 
 
-def surprise(reachy):
+def surprise(reachy, clock=real_clock):
     logger.info('Starting behavior', extra={'behavior': 'suprise'})
 
     q = Quaternion(axis=[1, 0, 0], angle=np.deg2rad(22))
@@ -106,7 +108,7 @@ def surprise(reachy):
         }, duration=0.3, wait=True,
     )
 
-    time.sleep(1)
+    clock.sleep(1, 'behavior')
     head_home(reachy, duration=1)
 
     logger.info('Ending behavior', extra={'behavior': 'suprise'})
@@ -0,0 +1,389 @@
+import os
+import sys
+import json
+import time
+import subprocess
+import numpy as np
+import cv2 as cv
+
+from glob import glob
+
+
+def list_frames(path, limit=None):
+    files = sorted(
+        f for f in glob(os.path.join(path, '*'))
+        if os.path.splitext(f)[1].lower() in ('.jpg', '.jpeg', '.png')
+    )
+    if limit is not None:
+        files = files[:limit]
+
+    return files
+
+
+def load_frames(path, limit=None):
+    return [cv.imread(f) for f in list_frames(path, limit)]
+
+
+def report(name, latencies, unit='ms'):
+    lat = {'s': 1, 'ms': 1e3, 'us': 1e6}[unit] * np.array(latencies)
+    print(
+        f'{name:<32} n={len(lat):<5d} '
+        f'mean={lat.mean():7.2f} {unit}  '
+        f'p50={np.percentile(lat, 50):7.2f} {unit}  '
+        f'p95={np.percentile(lat, 95):7.2f} {unit}'
+    )
+
+
+def bench_backends(args):
+    from .inference import Classifier
+    from .vision import board_cases, board_rect, preprocess
+
+    frames = load_frames(args.frames, args.limit)
+    if not frames:
+        raise SystemExit(f'No frame found in "{args.frames}".')
+
+    predictions = {}
+
+    for backend in args.backends:
+        try:
+            boxes = Classifier('ttt-boxes', backend, args.num_threads)
+            valid = Classifier('ttt-valid-board', backend, args.num_threads)
+        except (ImportError, OSError, ValueError) as e:
+            print(f'Skipping backend "{backend}": {e}')
+            continue
+
+        boxes_lat, valid_lat, labels = [], [], []
+
+        for img in frames:
+            boxes_batch = preprocess(boxes, img, board_cases.reshape(-1, 4))
+            valid_batch = preprocess(valid, img, [board_rect])
+
+            for _ in range(args.runs):
+                tic = time.time()
+                probs = boxes.predict(boxes_batch)
+                boxes_lat.append(time.time() - tic)
+
+                tic = time.time()
+                valid.predict(valid_batch)
+                valid_lat.append(time.time() - tic)
+
+            labels.append(probs.argmax(axis=1))
+
+        predictions[backend] = np.array(labels)
+
+        threads = f' ({boxes.backend.num_threads} threads)' if backend == 'cpu' else ''
+        report(f'{backend}{threads} boxes x9', boxes_lat)
+        report(f'{backend}{threads} valid-board', valid_lat)
+
+    if len(predictions) > 1:
+        ref_name, *others = predictions.keys()
+        for name in others:
+            agreement = np.mean(predictions[name] == predictions[ref_name])
+            print(f'Cell agreement {name} vs {ref_name}: {100 * agreement:.1f}%')
+
+
+startup_script = '''
+import sys
+import json
+import time
+
+tic = time.time()
+import reachy_tictactoe  # noqa: F401
+from reachy_tictactoe import resources, vision
+import_time = time.time() - tic
+
+import cv2 as cv
+import numpy as np
+
+frame_path, warmup = sys.argv[1], sys.argv[2] == 'warmup'
+frame = cv.imread(frame_path) if frame_path else np.zeros((720, 960, 3), dtype=np.uint8)
+
+tic = time.time()
+if warmup:
+    resources.warmup()
+vision.is_board_valid(frame)
+vision.get_board_configuration(frame)
+first_analysis = time.time() - tic
+
+print(json.dumps({'import': import_time, 'first_analysis': first_analysis}))
+'''
+
+
+def bench_startup(args):
+    timings = {'import': [], 'first_analysis': []}
+
+    for _ in range(args.runs):
+        out = subprocess.check_output([
+            sys.executable, '-c', startup_script,
+            args.frame or '', 'warmup' if args.warmup else '',
+        ])
+        res = json.loads(out.decode().strip().splitlines()[-1])
+
+        for k, v in res.items():
+            timings[k].append(v)
+
+    report('import reachy_tictactoe', timings['import'])
+    report('time to first board analysis', timings['first_analysis'])
+
+
+def set_get_winner(board):
+    # Reference implementation (also for the tests): the set based check the
+    # playground used to run.
+    from .rules import win_configurations
+    from .utils import id2piece, piece2player
+
+    for c in win_configurations:
+        trio = set(board[i] for i in c)
+        for id in id2piece.keys():
+            if trio == set([id]):
+                winner = piece2player[id2piece[id]]
+                if winner in ('robot', 'human'):
+                    return winner
+
+    return 'nobody'
+
+
+def set_is_final(board):
+    if set_get_winner(board) in ('robot', 'human'):
+        return True
+    return 0 not in board
+
+
+def bench_rules(args):
+    from . import rules
+
+    rules.outcomes.get()
+    boards = np.random.randint(0, 3, size=(args.nb_boards, 9)).astype(np.uint8)
+
+    for name, f in (
+        ('get_winner (sets)', set_get_winner),
+        ('get_winner (table)', rules.get_winner),
+        ('is_final (sets)', set_is_final),
+        ('is_final (table)', rules.is_final),
+    ):
+        latencies = []
+        for board in boards:
+            tic = time.perf_counter()
+            f(board)
+            latencies.append(time.perf_counter() - tic)
+        report(name, latencies, unit='us')
+
+    mismatches = sum(set_get_winner(b) != rules.get_winner(b) for b in boards)
+    print(f'Winner mismatches: {mismatches}/{len(boards)}')
+
+
+def _kmeans_group_1d(values, nb_groups):
+    # Reference implementation: the scikit-learn KMeans grouping used before.
+    from sklearn.cluster import KMeans
+
+    labels = KMeans(n_clusters=nb_groups, random_state=0).fit(values.reshape(-1, 1)).labels_
+    order = np.argsort([values[labels == i].mean() for i in range(nb_groups)])
+    return np.argsort(order)[labels]
+
+
+def bench_detect(args):
+    from . import detect_board
+    from .vision import board_cases, detection_roi
+
+    frames = load_frames(args.frames, args.limit)
+    if not frames:
+        raise SystemExit(f'No frame found in "{args.frames}".')
+
+    groupers = [('histogram', detect_board.group_1d)]
+    try:
+        import sklearn  # noqa: F401
+        groupers.append(('kmeans', _kmeans_group_1d))
+    except ImportError:
+        print('scikit-learn not installed, skipping the KMeans reference.')
+
+    results = {}
+    group_1d = detect_board.group_1d
+
+    for name, grouper in groupers:
+        detect_board.group_1d = grouper
+        latencies, cases, failures = [], [], 0
+
+        try:
+            for img in frames:
+                tic = time.time()
+                try:
+                    cases.append(detect_board.get_board_cases(img, detection_roi))
+                except Exception:
+                    cases.append(None)
+                    failures += 1
+                latencies.append(time.time() - tic)
+        finally:
+            detect_board.group_1d = group_1d
+
+        results[name] = cases
+
+        report(f'board detection ({name})', latencies)
+        print(f'  failures: {failures}/{len(frames)}')
+
+        offsets = [np.abs(c - board_cases).max() for c in cases if c is not None]
+        if offsets:
+            print(f'  max offset to the reference cells: median={np.median(offsets):.1f} px')
+
+    if 'kmeans' in results:
+        same = [
+            np.array_equal(a, b)
+            for a, b in zip(results['histogram'], results['kmeans'])
+            if a is not None and b is not None
+        ]
+        print(f'Identical layouts histogram vs kmeans: {sum(same)}/{len(same)}')
+
+
+def bench_pyramid(args):
+    from .inference import Classifier
+    from .vision import board_pyramid, preprocess, pyramid_levels, validity_input
+
+    frames = load_frames(args.frames, args.limit)
+    if not frames:
+        raise SystemExit(f'No frame found in "{args.frames}".')
+
+    valid = Classifier('ttt-valid-board', args.backend, args.num_threads)
+
+    # The full resolution board region (level 0) is always measured, as the reference.
+    levels = sorted({0} | set(args.levels if args.levels is not None else range(pyramid_levels)))
+    predictions, scores = {}, {}
+
+    for level in levels:
+        latencies, labels, level_scores = [], [], []
+
+        for img in frames:
+            for _ in range(args.runs):
+                tic = time.time()
+                pyramid = board_pyramid(img)
+                probs = valid.predict(preprocess(valid, *validity_input(img, pyramid, level)))
+                latencies.append(time.time() - tic)
+
+            labels.append(probs[0].argmax())
+            level_scores.append(probs[0].max())
+
+        predictions[level], scores[level] = np.array(labels), np.array(level_scores)
+        report(f'valid-board level {level}', latencies)
+
+    ref = 0
+    selected, accurate = ref, True
+    for level in levels[1:]:
+        agreement = np.mean(predictions[level] == predictions[ref])
+        score_diff = np.abs(scores[level] - scores[ref]).mean()
+        print(f'Level {level} vs {ref}: agreement={100 * agreement:.1f}% mean score diff={score_diff:.3f}')
+
+        accurate = accurate and agreement >= args.min_agreement
+        if accurate:
+            selected = level
+
+    print(f'Smallest level keeping {100 * args.min_agreement:.1f}% agreement: {selected}')
+    print(f'(use it with REACHY_TICTACTOE_VALIDITY_LEVEL={selected})')
+
+
+def _read_moves(moves):
+    # Sums every joint of every move: forces the npz decompression (or the
+    # reading of the mapped pages) of all the data.
+    return sum(float(np.sum(move[joint])) for move in moves for joint in move)
+
+
+def bench_moves(args):
+    import tempfile
+
+    from .moves.archive import MoveArchive, npz_names, pack_moves
+
+    names = npz_names(args.source_dir)
+    if not names:
+        print(f'No .npz move found in {args.source_dir}.')
+        return
+
+    archive_path = args.archive
+    if archive_path is None:
+        archive_path = os.path.join(tempfile.mkdtemp(), 'moves.bin')
+        pack_moves(names, path=archive_path, source_dir=args.source_dir)
+
+    timings = {k: [] for k in ('npz open', 'npz access', 'archive open', 'archive access')}
+
+    for _ in range(args.runs):
+        tic = time.perf_counter()
+        npz = [np.load(os.path.join(args.source_dir, f'{name}.npz')) for name in names]
+        timings['npz open'].append(time.perf_counter() - tic)
+
+        tic = time.perf_counter()
+        _read_moves(npz)
+        timings['npz access'].append(time.perf_counter() - tic)
+
+        for f in npz:
+            f.close()
+
+        tic = time.perf_counter()
+        archive = MoveArchive(archive_path)
+        packed = [archive.move(name) for name in names]
+        timings['archive open'].append(time.perf_counter() - tic)
+
+        tic = time.perf_counter()
+        _read_moves(packed)
+        timings['archive access'].append(time.perf_counter() - tic)
+
+    print(f'{len(names)} moves')
+    for name, latencies in timings.items():
+        report(name, latencies)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    backends_parser = subparsers.add_parser(
+        'backends', help='Compare the inference backends on the same recorded frames.',
+    )
+    backends_parser.add_argument('frames', help='Directory of recorded camera frames.')
+    backends_parser.add_argument('--backends', nargs='+', default=['edgetpu', 'cpu'])
+    backends_parser.add_argument('--num-threads', type=int)
+    backends_parser.add_argument('--runs', type=int, default=5)
+    backends_parser.add_argument('--limit', type=int)
+    backends_parser.set_defaults(func=bench_backends)
+
+    startup_parser = subparsers.add_parser(
+        'startup', help='Measure the import time and the time to the first board analysis.',
+    )
+    startup_parser.add_argument('--frame', help='Recorded camera frame to analyze.')
+    startup_parser.add_argument('--warmup', action='store_true', help='Explicitly warm up all resources first.')
+    startup_parser.add_argument('--runs', type=int, default=5)
+    startup_parser.set_defaults(func=bench_startup)
+
+    rules_parser = subparsers.add_parser(
+        'rules', help='Compare the outcome lookup table with the set based rule checks.',
+    )
+    rules_parser.add_argument('--nb-boards', type=int, default=10000)
+    rules_parser.set_defaults(func=bench_rules)
+
+    detect_parser = subparsers.add_parser(
+        'detect', help='Time the board grid detection on recorded frames.',
+    )
+    detect_parser.add_argument('frames', help='Directory of recorded camera frames.')
+    detect_parser.add_argument('--limit', type=int)
+    detect_parser.set_defaults(func=bench_detect)
+
+    pyramid_parser = subparsers.add_parser(
+        'pyramid', help='Sweep the pyramid levels the board validity classifier can run on.',
+    )
+    pyramid_parser.add_argument('frames', help='Directory of recorded camera frames.')
+    pyramid_parser.add_argument('--levels', type=int, nargs='+')
+    pyramid_parser.add_argument('--min-agreement', type=float, default=0.99)
+    pyramid_parser.add_argument('--backend')
+    pyramid_parser.add_argument('--num-threads', type=int)
+    pyramid_parser.add_argument('--runs', type=int, default=5)
+    pyramid_parser.add_argument('--limit', type=int)
+    pyramid_parser.set_defaults(func=bench_pyramid)
+
+    moves_parser = subparsers.add_parser(
+        'moves', help='Compare loading the moves from the .npz files and from the packed archive.',
+    )
+    moves_parser.add_argument('--source-dir', default=os.path.join(os.path.dirname(__file__), 'moves'))
+    moves_parser.add_argument('--archive', help='Packed archive (packed from the source directory if not given).')
+    moves_parser.add_argument('--runs', type=int, default=20)
+    moves_parser.set_defaults(func=bench_moves)
+
+    args = parser.parse_args()
+    args.func(args)
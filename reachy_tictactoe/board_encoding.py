@@ -0,0 +1,48 @@
+import numpy as np
+
+
+NB_BOARDS = 3 ** 9
+
+# The first cell is the most significant digit, so a code is also the flat
+# index of the board in a C-ordered (3, ) * 9 array.
+powers = 3 ** np.arange(8, -1, -1, dtype=np.int64)
+
+# The 8 symmetries of the square (rotations and mirrors) as cell permutations.
+_rot = (6, 3, 0, 7, 4, 1, 8, 5, 2)
+_mirror = (2, 1, 0, 5, 4, 3, 8, 7, 6)
+
+
+def _compose(p, q):
+    return tuple(p[i] for i in q)
+
+
+_symmetries = [tuple(range(9))]
+for _ in range(3):
+    _symmetries.append(_compose(_symmetries[-1], _rot))
+_symmetries += [_compose(s, _mirror) for s in _symmetries]
+
+symmetries = np.array(_symmetries, dtype=np.int64)
+
+
+def encode(board):
+    return np.asarray(board, dtype=np.int64) @ powers
+
+
+def decode(code):
+    code = np.asarray(code, dtype=np.int64)
+    return ((code[..., None] // powers) % 3).astype(np.uint8)
+
+
+def canonicalize(board):
+    # Returns the smallest code among the 8 symmetric boards,
+    # and the index of the symmetry that produces it.
+    board = np.asarray(board)
+    codes = board[..., symmetries] @ powers
+    sym = codes.argmin(axis=-1)
+    return np.take_along_axis(codes, sym[..., None], axis=-1)[..., 0], sym
+
+
+def canonical_code(board):
+    # Pure Python version for a single board: the lexicographically smallest
+    # permuted board is also the one with the smallest code.
+    return int(encode(min(tuple(board[i] for i in s) for s in _symmetries)))
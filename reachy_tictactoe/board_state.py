@@ -0,0 +1,143 @@
+import numpy as np
+
+from .board_encoding import encode, powers
+from .utils import piece2id
+
+
+FULL = (1 << 9) - 1
+
+_bits = 1 << np.arange(9)
+_masks = np.arange(FULL + 1)
+
+# Code contribution and popcount of every 9-bit mask.
+_mask_codes = ((_masks[:, None] & _bits) != 0) @ powers
+_popcount = ((_masks[:, None] & _bits) != 0).sum(axis=1)
+
+_cube = piece2id['cube']
+_cylinder = piece2id['cylinder']
+
+
+class BoardState(object):
+    __slots__ = ('cubes', 'cylinders')
+
+    def __init__(self, cubes=0, cylinders=0):
+        if cubes & cylinders:
+            raise ValueError('A cell can not hold both a cube and a cylinder.')
+
+        object.__setattr__(self, 'cubes', cubes)
+        object.__setattr__(self, 'cylinders', cylinders)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('BoardState is immutable.')
+
+    @classmethod
+    def from_array(cls, board):
+        board = np.asarray(board).flatten()
+        return cls(
+            cubes=int(_bits[board == _cube].sum()),
+            cylinders=int(_bits[board == _cylinder].sum()),
+        )
+
+    def to_array(self):
+        board = np.zeros(9, dtype=np.uint8)
+        board[(self.cubes & _bits) != 0] = _cube
+        board[(self.cylinders & _bits) != 0] = _cylinder
+        return board
+
+    def __array__(self, dtype=None, copy=None):
+        board = self.to_array()
+        return board if dtype is None else board.astype(dtype)
+
+    @property
+    def code(self):
+        return int(_mask_codes[self.cubes] + _cylinder * _mask_codes[self.cylinders])
+
+    @property
+    def empty(self):
+        return FULL & ~(self.cubes | self.cylinders)
+
+    @property
+    def nb_cubes(self):
+        return int(_popcount[self.cubes])
+
+    @property
+    def nb_cylinders(self):
+        return int(_popcount[self.cylinders])
+
+    def is_empty(self):
+        return not (self.cubes | self.cylinders)
+
+    def is_coherent(self):
+        return abs(self.nb_cubes - self.nb_cylinders) <= 1
+
+    def place(self, index, piece):
+        bit = 1 << index
+        if not self.empty & bit:
+            raise ValueError(f'Cell {index} is not empty.')
+
+        if piece == _cube:
+            return BoardState(self.cubes | bit, self.cylinders)
+        elif piece == _cylinder:
+            return BoardState(self.cubes, self.cylinders | bit)
+        raise ValueError(f'Unknown piece {piece}.')
+
+    def diff(self, last):
+        # Masks of the cubes added, the cylinders added and the pieces removed since last.
+        added_cubes = self.cubes & ~last.cubes
+        added_cylinders = self.cylinders & ~last.cylinders
+        removed = (last.cubes & ~self.cubes) | (last.cylinders & ~self.cylinders)
+        return added_cubes, added_cylinders, removed
+
+    def one_cube_added(self, last):
+        added_cubes, _, _ = self.diff(last)
+        return _popcount[added_cubes] == 1
+
+    def one_cylinder_added(self, last):
+        _, added_cylinders, _ = self.diff(last)
+        return _popcount[added_cylinders] == 1
+
+    def is_valid_transition(self, last, reachy_turn):
+        # Nothing changed
+        if self == last:
+            return True
+
+        # A single cube was added
+        if self.one_cube_added(last):
+            return True
+
+        # A single cylinder was added, only the robot may do that
+        if self.one_cylinder_added(last):
+            return reachy_turn
+
+        return False
+
+    def __getitem__(self, index):
+        bit = 1 << index
+        if self.cubes & bit:
+            return _cube
+        if self.cylinders & bit:
+            return _cylinder
+        return piece2id['none']
+
+    def __iter__(self):
+        return (self[i] for i in range(9))
+
+    def __len__(self):
+        return 9
+
+    def __eq__(self, other):
+        if not isinstance(other, BoardState):
+            return NotImplemented
+        return self.cubes == other.cubes and self.cylinders == other.cylinders
+
+    def __hash__(self):
+        return hash((self.cubes, self.cylinders))
+
+    def __repr__(self):
+        return f'BoardState({list(self)})'
+
+
+def board_code(board):
+    if isinstance(board, BoardState):
+        return board.code
+    return encode(board)
@@ -0,0 +1,177 @@
+import os
+import logging
+import numpy as np
+import cv2 as cv
+
+from .detect_board import cases_from_corners, get_board_corners
+
+
+logger = logging.getLogger('reachy.tictactoe.calibration')
+
+
+default_path = os.getenv(
+    'REACHY_TICTACTOE_CALIBRATION',
+    os.path.expanduser('~/.reachy_tictactoe/board-calibration.npz'),
+)
+
+
+class BoardCalibration(object):
+    def __init__(self, path=default_path, cell_size=128,
+                 reference_cases=None, tolerance=40,
+                 check_period=10, retry_period=30, drift_tolerance=4,
+                 detection_level=0, roi=None):
+        self.path = path
+        self.cell_size = cell_size
+        self.reference_cases = reference_cases
+        self.tolerance = tolerance
+        self.check_period = check_period
+        self.retry_period = retry_period
+        self.drift_tolerance = drift_tolerance
+        # Pyramid level the grid is searched on, when the frame's pyramid is given.
+        self.detection_level = detection_level
+        # Region of the frame the grid is searched in (see detect_board.get_board_corners).
+        self.roi = roi
+
+        # Grid corners in the canonical board image, ordered as detect_board's.
+        c = cell_size
+        self.canonical_corners = np.array(
+            [(v * c, h * c) for v in range(4) for h in range(4)],
+            dtype=np.float32,
+        )
+        self.cell_rects = np.array([
+            (col * c, (col + 1) * c, row * c, (row + 1) * c)
+            for row in range(3) for col in range(3)
+        ])
+        self.size = (3 * c, 3 * c)
+
+        self.homography = None
+        self.corners = None
+        self._frames = 0
+
+        self.nb_calibrations = 0
+        self.nb_corrections = 0
+
+    @property
+    def is_calibrated(self):
+        return self.homography is not None
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return False
+
+        data = np.load(self.path)
+        self.homography = data['homography']
+        self.corners = data['corners']
+
+        logger.info('Board calibration loaded', extra={'path': self.path})
+        return True
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        np.savez(self.path, homography=self.homography, corners=self.corners)
+
+    def calibrate(self, img, pyramid=None):
+        try:
+            corners = get_board_corners(img, pyramid, self.detection_level, self.roi)
+        except Exception as e:
+            logger.warning('Board calibration failed', extra={'error': e})
+            return False
+
+        if self.reference_cases is not None:
+            offset = np.abs(cases_from_corners(corners) - self.reference_cases).max()
+            if offset > self.tolerance:
+                logger.warning('Calibrated board too far from the reference one', extra={
+                    'corners': corners,
+                    'offset': offset,
+                })
+                return False
+
+        homography, _ = cv.findHomography(corners.astype(np.float32), self.canonical_corners)
+        if homography is None:
+            return False
+
+        self.homography = homography
+        self.corners = corners
+        self.nb_calibrations += 1
+        self.save()
+
+        logger.info('Board calibrated', extra={'corners': corners})
+        return True
+
+    def warp(self, img):
+        return cv.warpPerspective(img, self.homography, self.size, flags=cv.INTER_LINEAR)
+
+    def track(self, img, warped=None, pyramid=None):
+        # Called on every frame: calibrates when needed (every retry_period
+        # frames until it succeeds) and checks for drift every check_period frames.
+        self._frames += 1
+
+        if not self.is_calibrated:
+            # retry_period=None disables the automatic calibration.
+            if self.retry_period is not None and (self._frames - 1) % self.retry_period == 0:
+                self.calibrate(img, pyramid)
+            return
+
+        if self._frames % self.check_period == 0:
+            if warped is None:
+                warped = self.warp(img)
+            self.check_drift(img, warped, pyramid)
+
+    def measure_lines(self, warped):
+        # Position offsets of the two inner vertical and horizontal grid lines
+        # in the canonical image, from the gradient profiles across them.
+        gray = cv.cvtColor(warped, cv.COLOR_BGR2GRAY)
+        c = self.cell_size
+        w = c // 4
+
+        offsets = []
+        for axis, order in ((0, 1), (1, 0)):
+            grad = cv.Sobel(gray, cv.CV_32F, order, 1 - order, ksize=3)
+            profile = np.convolve(grad.mean(axis=axis), np.ones(3) / 3, mode='same')
+            level = np.median(np.abs(profile))
+
+            for k in (1, 2):
+                window = profile[k * c - w:k * c + w + 1]
+                # A white line rises then falls: its center is between both edges
+                # (a single edge would be off by half the line width).
+                rise, fall = int(window.argmax()), int(window.argmin())
+                # Line not visible enough (e.g. hidden by a hand): no measure.
+                if window[rise] < 2 * level or -window[fall] < 2 * level or rise > fall:
+                    return None
+                offsets.append(int(round((rise + fall) / 2)) - w)
+
+        return np.array(offsets)
+
+    def check_drift(self, img, warped, pyramid=None):
+        offsets = self.measure_lines(warped)
+        if offsets is None or np.abs(offsets).max() <= self.drift_tolerance:
+            return False
+
+        logger.info('Board drift detected', extra={'offsets': offsets})
+
+        if np.abs(offsets).max() < self.cell_size // 4:
+            self.correct(offsets)
+        else:
+            self.calibrate(img, pyramid)
+
+        return True
+
+    def correct(self, offsets):
+        # Incremental recalibration: the inner corners measured in the canonical
+        # image are mapped back onto their ideal positions.
+        dx1, dx2, dy1, dy2 = offsets
+        c = self.cell_size
+
+        measured = np.array([
+            (c + dx1, c + dy1), (c + dx1, 2 * c + dy2),
+            (2 * c + dx2, c + dy1), (2 * c + dx2, 2 * c + dy2),
+        ], dtype=np.float32)
+        ideal = np.array([
+            (c, c), (c, 2 * c),
+            (2 * c, c), (2 * c, 2 * c),
+        ], dtype=np.float32)
+
+        correction = cv.getPerspectiveTransform(measured, ideal)
+        self.homography = correction @ self.homography
+        self.nb_corrections += 1
+        self.save()
@@ -0,0 +1,95 @@
+import logging
+
+from collections import deque, namedtuple
+from threading import Condition, Event, Thread
+
+from .clock import real_clock
+
+
+logger = logging.getLogger('reachy.tictactoe.camera')
+
+
+Frame = namedtuple('Frame', ['index', 'timestamp', 'img'])
+
+
+class FrameGrabber(object):
+    def __init__(self, camera, buffer_size=4, period=1 / 30, clock=real_clock):
+        self.camera = camera
+        self.period = period
+        # The frames are timestamped with the clock of the code waiting for them.
+        self.clock = clock
+
+        self._frames = deque(maxlen=buffer_size)
+        self._cond = Condition()
+        self._running = Event()
+        self._last_read_index = -1
+        self._t = None
+
+        self.nb_frames = 0
+        self.nb_dropped = 0
+        self.nb_failed_reads = 0
+
+    def start(self):
+        logger.info('Starting the camera frame grabber')
+        self._running.set()
+        self._t = Thread(target=self._grab, daemon=True)
+        self.clock.start(self._t)
+
+    def stop(self):
+        if self._t is None:
+            return
+
+        logger.info('Stopping the camera frame grabber', extra={
+            'stats': self.stats,
+        })
+        self._running.clear()
+        self.clock.join(self._t)
+        self._t = None
+
+    @property
+    def stats(self):
+        return {
+            'frames': self.nb_frames,
+            'dropped': self.nb_dropped,
+            'failed_reads': self.nb_failed_reads,
+        }
+
+    def latest(self):
+        with self._cond:
+            if not self._frames:
+                return None
+            return self._read(self._frames[-1])
+
+    def wait_for_frame_after(self, t, timeout=None):
+        with self._cond:
+            ready = self._cond.wait_for(
+                lambda: self._frames and self._frames[-1].timestamp > t,
+                timeout=timeout,
+            )
+            if not ready:
+                return None
+            return self._read(self._frames[-1])
+
+    def _read(self, frame):
+        self._last_read_index = max(self._last_read_index, frame.index)
+        return frame
+
+    def _grab(self):
+        while self._running.is_set():
+            success, img = self.camera.read()
+            timestamp = self.clock.time()
+
+            if not success or img is None or len(img) == 0:
+                self.nb_failed_reads += 1
+            else:
+                with self._cond:
+                    # The oldest frame is pushed out of the ring without having been read.
+                    if (len(self._frames) == self._frames.maxlen and
+                            self._frames[0].index > self._last_read_index):
+                        self.nb_dropped += 1
+
+                    self._frames.append(Frame(self.nb_frames, timestamp, img))
+                    self.nb_frames += 1
+                    self._cond.notify_all()
+
+            self.clock.sleep(self.period, None)
@@ -0,0 +1,117 @@
+import cv2 as cv
+
+from .preprocessing import RoiPyramid
+
+
+UNCHANGED, SETTLING, CHANGED = 'unchanged', 'settling', 'changed'
+
+
+class ChangeDetector(object):
+    def __init__(self, rect, level=3, threshold=6.0, settle_time=0.3, block=4, retry_period=1.0):
+        self.rect = rect
+        # The frames are compared at this level of their pyramid (1/8 scale by default).
+        self.level = level
+        # Differences are averaged over blocks of block x block thumbnail pixels,
+        # so that a single piece stands out however large the board region is.
+        self.block = block
+        self.threshold = threshold
+        self.settle_time = settle_time
+        # A frame that could not be classified is tried again after retry_period
+        # if the view has not changed meanwhile.
+        self.retry_period = retry_period
+
+        self._previous = None
+        self._reference = None
+        self._retry_at = None
+        self._still_since = None
+        self.changed_since = None
+
+        self.nb_frames = 0
+        self.nb_triggers = 0
+        self.nb_skipped = 0
+
+    @property
+    def stats(self):
+        return {
+            'frames': self.nb_frames,
+            'classifications': self.nb_triggers,
+            'skipped_classifications': self.nb_skipped,
+        }
+
+    def reset_stats(self):
+        self.nb_frames = 0
+        self.nb_triggers = 0
+        self.nb_skipped = 0
+
+    def thumbnail(self, img):
+        # img is either a frame or its pyramid (shared with the other vision stages).
+        if not isinstance(img, RoiPyramid):
+            img = RoiPyramid(img, self.rect, nb_levels=self.level + 1)
+        return img.crop(self.rect, self.level, gray=True)
+
+    def distance(self, a, b):
+        diff = cv.absdiff(a, b)
+        h, w = diff.shape
+        blocks = cv.resize(diff, (max(w // self.block, 1), max(h // self.block, 1)), interpolation=cv.INTER_AREA)
+        return float(blocks.max())
+
+    def update(self, img, timestamp):
+        # The board needs to be classified again (CHANGED) once it differs from
+        # the last classified frame and has been still for settle_time.
+        thumb = self.thumbnail(img)
+        self.nb_frames += 1
+
+        moving = self._previous is not None and self.distance(thumb, self._previous) > self.threshold
+        if moving or self._still_since is None:
+            self._still_since = timestamp
+        self._previous = thumb
+
+        if self._reference is None:
+            self.changed_since = timestamp
+            return CHANGED
+
+        if self.distance(thumb, self._reference) <= self.threshold:
+            if self._retry_at is not None and timestamp >= self._retry_at:
+                self.changed_since = timestamp
+                return CHANGED
+            self.changed_since = None
+            return UNCHANGED
+
+        if self.changed_since is None:
+            self.changed_since = timestamp
+
+        if timestamp - self._still_since >= self.settle_time:
+            return CHANGED
+
+        return SETTLING
+
+    def is_still(self, timestamp):
+        # Whether the frames have not changed for settle_time.
+        return self._still_since is not None and timestamp - self._still_since >= self.settle_time
+
+    def count(self, classified):
+        if classified:
+            self.nb_triggers += 1
+        else:
+            self.nb_skipped += 1
+
+    def accept(self, img):
+        self._reference = self.thumbnail(img)
+        self._retry_at = None
+        self.changed_since = None
+
+    def reject(self, img, timestamp):
+        # The frame could not be classified (e.g. a hand over the board): it is
+        # classified again once the view changed, or after retry_period.
+        self.accept(img)
+        self._retry_at = timestamp + self.retry_period
+
+    def reset_motion(self):
+        self._previous = None
+        self._still_since = None
+
+    def reset(self):
+        self.reset_motion()
+        self._reference = None
+        self._retry_at = None
+        self.changed_since = None
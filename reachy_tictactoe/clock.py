@@ -0,0 +1,200 @@
+import time
+
+from collections import defaultdict
+from contextlib import contextmanager
+from threading import Condition, Lock, Thread, current_thread, local
+
+
+class Clock(object):
+    # Every sleep is tagged with a reason: the time slept is totalled
+    # per reason (over all the threads sharing the clock), e.g. per game.
+    # The background threads sleep with no reason (None): their sleeps
+    # overlap the others and are not totalled. Neither are the ones of the
+    # tasks run concurrently with another, so that the totals add up to
+    # the time spent.
+    def __init__(self):
+        self._sleeps = defaultdict(float)
+        self._stats_lock = Lock()
+        self._concurrent = local()
+
+    def time(self):
+        raise NotImplementedError
+
+    def sleep(self, duration, reason='other'):
+        duration = max(duration, 0)
+        self._sleep(duration, reason)
+
+        if reason is None or getattr(self._concurrent, 'overlapped', False):
+            return
+
+        self._track(reason, duration)
+
+    def _track(self, reason, duration):
+        with self._stats_lock:
+            self._sleeps[reason] += duration
+
+    def _sleep(self, duration, reason):
+        raise NotImplementedError
+
+    def run_concurrently(self, *tasks):
+        # Runs the tasks in parallel (the first one in the calling thread)
+        # and waits for all of them to be done.
+        # Only the sleeps of the first one are totalled, then the time waited
+        # for the others (as 'concurrent').
+        errors = []
+
+        def run(task, overlapped):
+            self._concurrent.overlapped = overlapped
+            try:
+                task()
+            except Exception as e:
+                errors.append(e)
+
+        overlapped = getattr(self._concurrent, 'overlapped', False)
+        threads = [Thread(target=run, args=(task, True)) for task in tasks[1:]]
+        for t in threads:
+            t.start()
+        run(tasks[0], overlapped)
+        tic = self.time()
+        for t in threads:
+            t.join()
+        self._track_concurrent(self.time() - tic, overlapped)
+
+        if errors:
+            raise errors[0]
+
+    def _track_concurrent(self, duration, overlapped):
+        if not overlapped and duration > 0:
+            self._track('concurrent', duration)
+
+    def start(self, thread):
+        # Starts a background thread (sleeping with no reason).
+        thread.start()
+
+    def join(self, thread):
+        # Waits for a background thread (sleeping with no reason) to be done.
+        thread.join()
+
+    @property
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._sleeps)
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._sleeps.clear()
+
+
+class RealClock(Clock):
+    def time(self):
+        return time.time()
+
+    def _sleep(self, duration, reason):
+        time.sleep(duration)
+
+
+class VirtualClock(Clock):
+    # Sleeping only moves the time forward, so that tests and simulations
+    # run as fast as the code allows.
+    # The background threads (sleeping with no reason) wait for the others to
+    # move the time up to their wake up time, each one counted from the
+    # previous one (or from their start), so that neither the time nor their
+    # loops depend on how the threads are scheduled. Unless they are being
+    # joined: their sleeps then hold up the caller, and move the time forward.
+    def __init__(self, start=0.0):
+        Clock.__init__(self)
+        self._now = start
+        self._lock = Lock()
+        self._moved = Condition(self._lock)
+        self._nb_joins = 0
+        self._background = local()
+        self._starts = {}
+
+    def time(self):
+        return self._now
+
+    def _sleep(self, duration, reason):
+        with self._moved:
+            if reason is not None:
+                self._now += duration
+                self._moved.notify_all()
+                return
+
+            if not hasattr(self._background, 'wake_up'):
+                self._background.wake_up = self._starts.pop(current_thread(), self._now)
+            wake_up = self._background.wake_up + duration
+            self._background.wake_up = wake_up
+            while self._now < wake_up:
+                if self._nb_joins:
+                    self._now = wake_up
+                    self._moved.notify_all()
+                    return
+                self._moved.wait()
+
+    def start(self, thread):
+        with self._moved:
+            self._starts[thread] = self._now
+        thread.start()
+
+    def join(self, thread):
+        with self._moved:
+            self._nb_joins += 1
+            self._moved.notify_all()
+        try:
+            thread.join()
+        finally:
+            with self._moved:
+                self._nb_joins -= 1
+
+    def run_concurrently(self, *tasks):
+        # The tasks run one after the other, all of them from the same
+        # time: the time then goes on from the end of the longest one.
+        overlapped = getattr(self._concurrent, 'overlapped', False)
+        start = self._now
+        tasks[0]()
+        first_end = end = self._now
+
+        try:
+            self._concurrent.overlapped = True
+            for task in tasks[1:]:
+                with self._lock:
+                    self._now = start
+                task()
+                end = max(end, self._now)
+        finally:
+            self._concurrent.overlapped = overlapped
+
+        with self._moved:
+            self._now = end
+            self._moved.notify_all()
+        self._track_concurrent(end - first_end, overlapped)
+
+
+class PhaseTimer(object):
+    # Start and end times of the phases of a task (e.g. a robot turn),
+    # which may run concurrently: the task lasts less than their sum.
+    def __init__(self, clock):
+        self.clock = clock
+        self.start()
+
+    def start(self):
+        self._start = self.clock.time()
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        tic = self.clock.time()
+        try:
+            yield
+        finally:
+            self.phases.append((name, tic - self._start, self.clock.time() - tic))
+
+    def summary(self):
+        return {
+            'duration': self.clock.time() - self._start,
+            'phases': {name: duration for name, _, duration in self.phases},
+            'starts': {name: start for name, start, _ in self.phases},
+        }
+
+
+real_clock = RealClock()
@@ -1,74 +1,82 @@
 import cv2 as cv
 import numpy as np
 
-from sklearn.cluster import KMeans
 
+def group_1d(values, nb_groups):
+    # Split the sorted values at their (nb_groups - 1) largest gaps.
+    # Groups are labelled by increasing value.
+    if len(values) < nb_groups:
+        raise ValueError(f'Can not make {nb_groups} groups out of {len(values)} values.')
 
-def find_board(board_img):
+    order = np.argsort(values)
+    gaps = np.diff(values[order])
+    cuts = np.sort(np.argsort(gaps)[len(gaps) - (nb_groups - 1):]) + 1
+
+    labels = np.empty(len(values), dtype=int)
+    labels[order] = np.searchsorted(cuts, np.arange(len(values)), side='right')
+    return labels
+
+
+def find_board(board_img, scale=1.0):
     edges = cv.Canny(cv.cvtColor(board_img, cv.COLOR_BGR2GRAY), 210, 256)
 
     rho = 1  # distance resolution in pixels of the Hough grid
     theta = np.pi / 180  # angular resolution in radians of the Hough grid
     # minimum number of votes (intersections in Hough grid cell)
     threshold = 15
-    min_line_length = 150  # minimum number of pixels making up a line
-    max_line_gap = 50  # maximum gap in pixels between connectable line segment
+    min_line_length = 150 * scale  # minimum number of pixels making up a line
+    max_line_gap = 50 * scale  # maximum gap in pixels between connectable line segment
 
     # Run Hough on edge detected image
     # Output "lines" is an array containing endpoints of detected line segments
     lines = cv.HoughLinesP(edges, rho, theta, threshold, np.array([]),
                            min_line_length, max_line_gap)
+    if lines is None:
+        raise ValueError('No line found in the board image.')
+
+    x1, y1, x2, y2 = lines.reshape(-1, 4).astype(float).T
+    dx, dy = x2 - x1, y2 - y1
+
+    # The lines are classified by their angle (zero length segments are neither):
+    # horizontal ones as y = a * x + b, vertical ones as x = a * y + b, so that
+    # a perfectly vertical line keeps finite coefficients.
+    is_horizontal = np.abs(dy) < 0.1 * np.abs(dx)
+    is_vertical = np.abs(dx) < 0.5 * np.abs(dy)
+
+    a = dy[is_horizontal] / dx[is_horizontal]
+    horizontal = np.stack((a, y1[is_horizontal] - a * x1[is_horizontal]), axis=1)
+
+    a = dx[is_vertical] / dy[is_vertical]
+    vertical = np.stack((a, x1[is_vertical] - a * y1[is_vertical]), axis=1)
 
-    horizontal, vertical = [], []
-    for line in lines:
-        for x1, y1, x2, y2 in line:
-            a = (y2 - y1) / (x2 - x1)
-            b = y1 - a * x1
-
-            if np.abs(a) < 0.1:
-                horizontal.append((a, b))
-            elif np.abs(a) > 2:
-                vertical.append((a, b))
-
-    vertical = np.array(vertical)
-    V = np.array([(200 - b) / a for a, b in vertical]).reshape(-1, 1)
-    kmeans = KMeans(n_clusters=4, random_state=0).fit(V)
-    vertical = np.array(
-        [vertical[np.where(kmeans.labels_ == i)[0]].mean(axis=0)
-         for i in range(4)])
-
-    horizontal = np.array(horizontal)
-    H = np.array([200 * a + b for a, b in horizontal]).reshape(-1, 1)
-    kmeans = KMeans(n_clusters=4, random_state=0).fit(H)
-    horizontal = np.array(
-        [horizontal[np.where(kmeans.labels_ == i)[0]].mean(axis=0)
-         for i in range(4)])
-
-    V = np.array([(200 - b) / a for a, b in vertical])
-    vertical = vertical[V.argsort()]
-
-    H = np.array([200 * a + b for a, b in horizontal])
-    horizontal = horizontal[H.argsort()]
+    # Group the lines by their intercept with y=200 (vertical) or x=200 (horizontal)
+    V = 200 * vertical[:, 0] + vertical[:, 1]
+    labels = group_1d(V, 4)
+    vertical = np.array([vertical[labels == i].mean(axis=0) for i in range(4)])
+
+    H = 200 * horizontal[:, 0] + horizontal[:, 1]
+    labels = group_1d(H, 4)
+    horizontal = np.array([horizontal[labels == i].mean(axis=0) for i in range(4)])
 
     return vertical.tolist(), horizontal.tolist()
 
 
-def find_board_corners(board_img):
-    v, h = find_board(board_img)
+def find_board_corners(board_img, scale=1.0):
+    v, h = find_board(board_img, scale)
 
     corners = []
 
+    # x = a1 * y + b1 (vertical) meets y = a2 * x + b2 (horizontal)
     for a1, b1 in v:
         for a2, b2 in h:
-            x = (b2 - b1) / (a1 - a2)
-            y = a1 * x + b1
+            y = (a2 * b1 + b2) / (1 - a1 * a2)
+            x = a1 * y + b1
             corners.append((x, y))
 
-    return np.array(corners, dtype=np.int)
+    return np.array(corners) / scale
 
 
-def find_board_cases(board_img):
-    corners = find_board_corners(board_img)
+def cases_from_corners(corners):
     (A, E, I, M,
      B, F, J, N,
      C, G, K, O,
@@ -86,18 +94,30 @@ def find_board_cases(board_img):
         ((M[0], N[0], J[1], N[1]),
          (N[0], O[0], K[1], O[1]),
          (O[0], P[0], L[1], P[1]), ),
-    ), dtype=np.int)
+    ), dtype=int)
 
     return board_cases
 
 
-def get_board_cases(img):
-    ly, ry, lx, rx = 325, 700, 275, 710
-    img = img[ly:ry, lx:rx, :]
+def find_board_cases(board_img):
+    return cases_from_corners(find_board_corners(board_img))
+
+
+def get_board_corners(img, pyramid=None, level=0, roi=None):
+    # The grid is searched in roi (left, right, top, bottom), which must contain
+    # the whole grid (the whole frame, or the pyramid's region, by default).
+    # It can be searched on a downscaled level of the frame's pyramid.
+    if pyramid is None:
+        lx, rx, ly, ry = roi if roi is not None else (0, img.shape[1], 0, img.shape[0])
+        crop, origin, level = img[ly:ry, lx:rx, :], (lx, ly), 0
+    else:
+        if roi is None:
+            roi = pyramid.rect
+        crop, origin = pyramid.crop(roi, level), pyramid.origin(roi, level)
+
+    corners = find_board_corners(crop, scale=1 / 2 ** level)
+    return (corners + origin).astype(int)
 
-    cases = find_board_cases(img)
-    for row in range(3):
-        for col in range(3):
-            cases[row, col] += (lx, lx, ly, ly)
 
-    return cases
+def get_board_cases(img, roi=None):
+    return cases_from_corners(get_board_corners(img, roi=roi))
@@ -0,0 +1,44 @@
+import numpy as np
+
+
+class BoardFusion(object):
+    def __init__(self, nb_cells=9, nb_labels=3, decay=0.7, confidence=0.9, min_frames=3):
+        self.decay = decay
+        self.confidence = confidence
+        self.min_frames = min_frames
+
+        self._log_posterior = np.zeros((nb_cells, nb_labels))
+        self._labels = np.zeros(nb_cells, dtype=np.int64)
+        self._stable = np.zeros(nb_cells, dtype=np.int64)
+
+        self.nb_frames = 0
+
+    def reset(self):
+        self._log_posterior[:] = 0
+        self._labels[:] = 0
+        self._stable[:] = 0
+        self.nb_frames = 0
+
+    @property
+    def posterior(self):
+        p = np.exp(self._log_posterior - self._log_posterior.max(axis=1, keepdims=True))
+        return p / p.sum(axis=1, keepdims=True)
+
+    def update(self, probs):
+        # Per cell scores are accumulated as decayed log-probabilities, so old
+        # frames fade out and a single bad frame can not flip a cell on its own.
+        self._log_posterior *= self.decay
+        self._log_posterior += np.log(np.clip(probs, 1e-4, 1.0))
+        self.nb_frames += 1
+
+        posterior = self.posterior
+        labels = posterior.argmax(axis=1)
+
+        self._stable = np.where(labels == self._labels, self._stable + 1, 1)
+        self._labels = labels
+
+        confident = posterior[np.arange(len(labels)), labels] >= self.confidence
+
+        # A board is only reported once every cell is confident and stable.
+        if np.all(confident) and np.all(self._stable >= self.min_frames):
+            return labels.astype(np.uint8)
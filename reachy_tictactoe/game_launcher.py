@@ -1,5 +1,4 @@
 import logging
-import numpy as np
 
 import zzlog
 
@@ -45,43 +44,44 @@ def run_game_loop(tictactoe_playground):
 
     # Start game loop
     while True:
-        board = tictactoe_playground.analyze_board()
+        if reachy_turn:
+            tictactoe_playground.start_turn()
+            # The head stays on the board: it moves along with the arm afterwards.
+            with tictactoe_playground.turn_timer.phase('analyze'):
+                board = tictactoe_playground.analyze_board(keep_head_on_board=True)
+        else:
+            # When it's human's turn to play
+            # We keep watching the board until it changes
+            board = tictactoe_playground.watch_board(last_board)
 
         # We found an invalid board
         if board is None:
             logger.warning('Invalid board detected')
             continue
 
-        # When it's human's turn to play
-        # We wait for a change in board while running random idle behavior
         if not reachy_turn:
             if tictactoe_playground.has_human_played(board, last_board):
                 reachy_turn = True
+                tictactoe_playground.start_turn()
                 logger.info('Next turn', extra={
                     'next_player': 'Reachy',
                 })
-            else:
-                tictactoe_playground.run_random_idle_behavior()
 
         # If we have detected some cheating or any issue
         # We reset the whole game
+        # (the board has already been confirmed over several frames)
         if (tictactoe_playground.incoherent_board_detected(board) or
                 tictactoe_playground.cheating_detected(board, last_board, reachy_turn)):
-            # Check again to be sure
-            double_check_board = tictactoe_playground.analyze_board()
-            if np.any(double_check_board != board):
-                # False detection, we will check again next loop
-                continue
-
-            # We're pretty sure somthing weird happened!
             tictactoe_playground.shuffle_board()
             break
 
         # When it's the robot's turn to play
         # We decide which action to take and plays it
         if (not tictactoe_playground.is_final(board)) and reachy_turn:
-            action, _ = tictactoe_playground.choose_next_action(board)
+            with tictactoe_playground.turn_timer.phase('decide'):
+                action, _ = tictactoe_playground.choose_next_action(board)
             board = tictactoe_playground.play(action, board)
+            tictactoe_playground.end_turn()
 
             last_board = board
             reachy_turn = False
@@ -106,6 +106,51 @@ def run_game_loop(tictactoe_playground):
     logger.info('Game end')
 
 
+def add_totals(total, counts):
+    for key, value in counts.items():
+        total[key] = total.get(key, 0) + value
+
+
+def run_games(tictactoe_playground, nb_games=None):
+    # Plays nb_games games (forever if None), cooling down when needed.
+    # The time slept by the playground is totalled per reason, for each game,
+    # and the vision stats over all the games.
+    stats = {'winners': {}, 'cooldowns': 0, 'sleeps': {}, 'vision': {}}
+    clock = tictactoe_playground.clock
+    game_played = 0
+
+    while nb_games is None or game_played < nb_games:
+        clock.reset_stats()
+        winner = run_game_loop(tictactoe_playground)
+        sleeps = clock.stats
+        game_played += 1
+        stats['winners'][winner] = stats['winners'].get(winner, 0) + 1
+        logger.info(
+            'Game ended',
+            extra={
+                'game_number': game_played,
+                'winner': winner,
+                'vision_stats': tictactoe_playground.vision_stats,
+                'sleeps': sleeps,
+            }
+        )
+        add_totals(stats['vision'], tictactoe_playground.vision_stats)
+        tictactoe_playground.reset_vision_stats()
+        add_totals(stats['sleeps'], sleeps)
+
+        if tictactoe_playground.need_cooldown():
+            logger.warning('Reachy needs cooldown')
+            clock.reset_stats()
+            tictactoe_playground.enter_sleep_mode()
+            tictactoe_playground.wait_for_cooldown()
+            tictactoe_playground.leave_sleep_mode()
+            stats['cooldowns'] += 1
+            add_totals(stats['sleeps'], clock.stats)
+            logger.info('Reachy cooldown finished')
+
+    return stats
+
+
 if __name__ == '__main__':
     import argparse
 
@@ -133,23 +178,4 @@ if __name__ == '__main__':
 
     with TictactoePlayground() as tictactoe_playground:
         tictactoe_playground.setup()
-
-        game_played = 0
-
-        while True:
-            winner = run_game_loop(tictactoe_playground)
-            game_played += 1
-            logger.info(
-                'Game ended',
-                extra={
-                    'game_number': game_played,
-                    'winner': winner,
-                }
-            )
-
-            if tictactoe_playground.need_cooldown():
-                logger.warning('Reachy needs cooldown')
-                tictactoe_playground.enter_sleep_mode()
-                tictactoe_playground.wait_for_cooldown()
-                tictactoe_playground.leave_sleep_mode()
-                logger.info('Reachy cooldown finished')
+        run_games(tictactoe_playground)
@@ -0,0 +1,186 @@
+import os
+import logging
+import numpy as np
+
+
+logger = logging.getLogger('reachy.tictactoe.inference')
+
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+model_path = os.path.join(dir_path, 'models')
+
+
+def read_label_file(path):
+    labels = {}
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            i, label = line.split(maxsplit=1)
+            labels[int(i)] = label
+    return labels
+
+
+class EdgeTPUBackend(object):
+    name = 'edgetpu'
+    model_suffix = '.tflite'
+
+    def __init__(self, model, **kwargs):
+        from edgetpu.classification.engine import ClassificationEngine
+
+        self.engine = ClassificationEngine(model)
+
+        _, h, w, _ = self.engine.get_input_tensor_shape()
+        self.input_size = (h, w)
+        self.nb_labels = int(self.engine.get_all_output_tensors_sizes()[0])
+
+    def predict(self, batch):
+        # The Edge TPU models are compiled with a batch size of 1, so the batch
+        # is fed as consecutive raw input tensors.
+        probs = np.zeros((len(batch), self.nb_labels), dtype=np.float32)
+
+        for i, input_tensor in enumerate(batch.reshape(len(batch), -1)):
+            res = self.engine.classify_with_input_tensor(
+                input_tensor, threshold=0.0, top_k=self.nb_labels,
+            )
+            assert res
+
+            for label, score in res:
+                probs[i, label] = score
+
+        return probs
+
+
+class TFLiteBackend(object):
+    name = 'cpu'
+    model_suffix = '-int8.tflite'
+
+    def __init__(self, model, num_threads=None, **kwargs):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+
+        if num_threads is None:
+            num_threads = os.cpu_count()
+
+        self.num_threads = num_threads
+        self.interpreter = Interpreter(model_path=model, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+
+        _, h, w, _ = self._input['shape']
+        self.input_size = (h, w)
+        self.nb_labels = int(self._output['shape'][-1])
+        self._batch_size = 1
+
+    def predict(self, batch):
+        if len(batch) != self._batch_size:
+            h, w = self.input_size
+            self.interpreter.resize_tensor_input(self._input['index'], [len(batch), h, w, 3])
+            self.interpreter.allocate_tensors()
+            self._input = self.interpreter.get_input_details()[0]
+            self._output = self.interpreter.get_output_details()[0]
+            self._batch_size = len(batch)
+
+        # Full integer models take int8 inputs: shift the uint8 pixels by 128.
+        if self._input['dtype'] == np.int8:
+            batch = (batch ^ 0x80).view(np.int8)
+
+        self.interpreter.set_tensor(self._input['index'], batch)
+        self.interpreter.invoke()
+        out = self.interpreter.get_tensor(self._output['index'])
+
+        scale, zero_point = self._output['quantization']
+        if scale:
+            return scale * (out.astype(np.float32) - zero_point)
+        return out.astype(np.float32)
+
+
+class StubBackend(object):
+    name = 'stub'
+    # No model is needed: the labels file gives the number of outputs.
+    model_suffix = '.txt'
+
+    def __init__(self, model, input_size=(224, 224), **kwargs):
+        self.input_size = input_size
+        self.nb_labels = len(read_label_file(model))
+
+    def predict(self, batch):
+        # Deterministic fake predictions (from the crops mean intensity), to
+        # exercise and time the vision pipeline without any model or accelerator.
+        probs = np.zeros((len(batch), self.nb_labels), dtype=np.float32)
+        labels = batch.reshape(len(batch), -1).mean(axis=1).astype(int) % self.nb_labels
+        probs[np.arange(len(batch)), labels] = 1
+        return probs
+
+
+backends = {
+    EdgeTPUBackend.name: EdgeTPUBackend,
+    TFLiteBackend.name: TFLiteBackend,
+    StubBackend.name: StubBackend,
+}
+
+
+def model_file(name, backend):
+    return os.path.join(model_path, f'{name}{backends[backend].model_suffix}')
+
+
+def default_backend(name=None):
+    # Given a model name, its file for the CPU fallback is checked here, so
+    # that a missing export is reported as such rather than as a load error.
+    backend = os.getenv('REACHY_TICTACTOE_BACKEND')
+    if backend is not None:
+        return backend
+
+    try:
+        import edgetpu  # noqa: F401
+        return EdgeTPUBackend.name
+    except ImportError:
+        pass
+
+    if name is not None and not os.path.exists(model_file(name, TFLiteBackend.name)):
+        raise FileNotFoundError(
+            f'No Edge TPU runtime found and the CPU model {model_file(name, TFLiteBackend.name)} '
+            'is missing: export the int8 quantized model, install the Edge TPU runtime, '
+            'or set REACHY_TICTACTOE_BACKEND.'
+        )
+
+    return TFLiteBackend.name
+
+
+def default_num_threads():
+    num_threads = os.getenv('REACHY_TICTACTOE_NUM_THREADS')
+    return int(num_threads) if num_threads is not None else None
+
+
+class Classifier(object):
+    def __init__(self, name, backend=None, num_threads=None):
+        if backend is None:
+            backend = default_backend(name)
+        if num_threads is None:
+            num_threads = default_num_threads()
+
+        path = model_file(name, backend)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f'Model {path} not found for the {backend} backend.')
+
+        self.name = name
+        self.backend = backends[backend](path, num_threads=num_threads)
+        self.labels = read_label_file(os.path.join(model_path, f'{name}.txt'))
+
+        logger.info('Classifier loaded', extra={
+            'model': name,
+            'backend': backend,
+            'num_threads': num_threads,
+        })
+
+    @property
+    def input_size(self):
+        return self.backend.input_size
+
+    def predict(self, batch):
+        return self.backend.predict(batch)
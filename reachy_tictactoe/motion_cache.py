@@ -0,0 +1,152 @@
+import os
+import time
+import json
+import hashlib
+import logging
+import numpy as np
+
+from . import resources, trajectory
+from .moves import dir_path as moves_dir, base_pos, rest_pos
+from .packed import read_packed, write_packed
+from .trajectory import COMPOSER_VERSION, compose_play_pawn, default_blend
+
+
+logger = logging.getLogger('reachy.tictactoe.motion_cache')
+
+
+CACHE_VERSION = 1
+
+cache_path = os.path.join(moves_dir, f'play-pawn-v{CACHE_VERSION}.bin')
+
+grab_indices = range(1, 6)
+box_indices = range(1, 10)
+
+# The cached trajectories start from the rest position.
+start_position = dict(base_pos, **rest_pos)
+
+# The moves the trajectories are composed from.
+source_moves = (
+    [f'grab_{g}' for g in grab_indices] +
+    ['lift', 'back_to_back', 'back_rest'] +
+    [f'put_{b}_smooth_10_kp' for b in box_indices] +
+    [f'back_{b}_upright' for b in box_indices]
+)
+
+
+def sources_digest(freq=100):
+    # Everything the compiled trajectories depend on: the composition
+    # parameters, the composer's code and the recorded moves.
+    sha = hashlib.sha1()
+    sha.update(json.dumps({
+        'composer': COMPOSER_VERSION,
+        'blend': default_blend,
+        'freq': freq,
+        'start': start_position,
+    }, sort_keys=True).encode())
+    with open(trajectory.__file__, 'rb') as f:
+        sha.update(f.read())
+    for name in source_moves:
+        with open(os.path.join(moves_dir, f'{name}.npz'), 'rb') as f:
+            sha.update(f.read())
+    return sha.hexdigest()
+
+
+def compile_cache(path=cache_path, freq=100):
+    header = {
+        'version': CACHE_VERSION,
+        'freq': freq,
+        'start': start_position,
+        'sources': sources_digest(freq),
+        'trajectories': {},
+    }
+    blocks = []
+    offset = 0
+
+    for g in grab_indices:
+        for b in box_indices:
+            entries = []
+            for trajectory in compose_play_pawn(g, b, start=start_position, freq=freq):
+                motors = list(trajectory)
+                block = np.stack([trajectory[m] for m in motors])
+                entries.append({'motors': motors, 'offset': offset, 'length': block.shape[1]})
+                blocks.append(block.ravel())
+                offset += block.size
+            header['trajectories'][f'{g},{b}'] = entries
+
+    # Each trajectory is stored motor after motor (see packed.py).
+    write_packed(path, header, blocks)
+    return header
+
+
+class PlayPawnCache(object):
+    def __init__(self, path):
+        self.header, self.data = read_packed(path)
+
+        self.freq = self.header['freq']
+        self.start = self.header['start']
+
+    def matches(self, start, freq=100, tolerance=0.5):
+        return freq == self.freq and all(
+            abs(start.get(m, p) - p) <= tolerance
+            for m, p in self.start.items()
+        )
+
+    def get(self, grab_index, box_index):
+        # Views on the mapped file: nothing is copied.
+        trajectories = []
+        for entry in self.header['trajectories'][f'{grab_index},{box_index}']:
+            offset, length = entry['offset'], entry['length']
+            trajectories.append({
+                m: self.data[offset + i * length:offset + (i + 1) * length]
+                for i, m in enumerate(entry['motors'])
+            })
+        return trajectories
+
+
+def load_cache(path=cache_path):
+    if not os.path.exists(path):
+        logger.info('No compiled play pawn trajectories', extra={'path': path})
+        return None
+
+    cache = PlayPawnCache(path)
+
+    try:
+        stale = cache.header['sources'] != sources_digest(cache.freq)
+    except OSError:
+        stale = True
+
+    if cache.header['version'] != CACHE_VERSION or stale:
+        logger.warning('Compiled play pawn trajectories out of date, they will be composed on the fly', extra={
+            'path': path,
+        })
+        return None
+
+    return cache
+
+
+cache = resources.register('play_pawn_cache', load_cache)
+
+
+def play_pawn_trajectories(grab_index, box_index, start, freq=100):
+    # Compiled trajectories when available for this start position, composed otherwise.
+    compiled = cache.get()
+    if compiled is not None and compiled.matches(start, freq):
+        return compiled.get(grab_index, box_index)
+
+    return compose_play_pawn(grab_index, box_index, start=start, freq=freq)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Compile the play pawn trajectories for all the (grab, box) pairs.',
+    )
+    parser.add_argument('--output', default=cache_path)
+    args = parser.parse_args()
+
+    tic = time.time()
+    header = compile_cache(args.output)
+
+    print(f'{len(header["trajectories"])} play pawn moves written to {args.output} '
+          f'({os.path.getsize(args.output) / 1e6:.1f}MB) in {time.time() - tic:.2f}s.')
@@ -1,20 +1,58 @@
 import os
+import logging
 import numpy as np
 
-from glob import glob
+from collections.abc import Mapping
+from functools import partial
+
+from .. import resources
+from .archive import MoveArchive, archive_path, is_up_to_date, npz_names
 
 dir_path = os.path.dirname(os.path.realpath(__file__))
 
+logger = logging.getLogger('reachy.tictactoe.moves')
 
-names = [
-    os.path.splitext(os.path.basename(f))[0]
-    for f in glob(os.path.join(dir_path, '*.npz'))
-]
 
-moves = {
-    name: np.load(os.path.join(dir_path, f'{name}.npz'))
-    for name in names
-}
+def load_npz(name):
+    return np.load(os.path.join(dir_path, f'{name}.npz'))
+
+
+def open_library():
+    # The packed archive (see archive.py) when it is up to date, the .npz files otherwise.
+    if is_up_to_date():
+        archive = MoveArchive(archive_path)
+        return archive.names, archive.move
+
+    if os.path.exists(archive_path):
+        logger.warning('Move archive out of date, using the .npz moves', extra={
+            'path': archive_path,
+        })
+
+    return npz_names(), load_npz
+
+
+class LazyMoves(Mapping):
+    def __init__(self, names, load=load_npz):
+        self._moves = {
+            name: resources.register(f'moves.{name}', partial(load, name))
+            for name in names
+        }
+
+    def __getitem__(self, name):
+        return self._moves[name].get()
+
+    def __iter__(self):
+        return iter(self._moves)
+
+    def __len__(self):
+        return len(self._moves)
+
+    def set_loader(self, name, loader):
+        self._moves[name].set_loader(loader)
+
+
+names, _load_move = open_library()
+moves = LazyMoves(names, _load_move)
 
 
 rest_pos = {
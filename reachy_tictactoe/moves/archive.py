@@ -0,0 +1,136 @@
+import os
+import time
+import hashlib
+import numpy as np
+
+from glob import glob
+
+from ..packed import read_packed, write_packed
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+
+
+ARCHIVE_VERSION = 2
+
+archive_path = os.path.join(dir_path, f'moves-v{ARCHIVE_VERSION}.bin')
+
+
+def npz_names(path=dir_path):
+    return sorted(
+        os.path.splitext(os.path.basename(f))[0]
+        for f in glob(os.path.join(path, '*.npz'))
+    )
+
+
+def sources_digest(names, source_dir=dir_path, freq=100):
+    # Content of the packed .npz moves (modification times are not kept by
+    # git checkouts or copies) and the sample rate they were packed with.
+    sha = hashlib.sha1(f'freq={freq}'.encode())
+    for name in names:
+        sha.update(name.encode())
+        with open(os.path.join(source_dir, f'{name}.npz'), 'rb') as f:
+            sha.update(f.read())
+    return sha.hexdigest()
+
+
+def pack_moves(names=None, path=archive_path, source_dir=dir_path, freq=100):
+    # Packs the .npz moves in a single archive: each move is stored joint
+    # after joint, the header gives its joints, shape and offset, and the
+    # sample rate of the moves.
+    if names is None:
+        names = npz_names(source_dir)
+
+    header = {
+        'version': ARCHIVE_VERSION,
+        'freq': freq,
+        'sources': sources_digest(names, source_dir, freq),
+        'moves': {},
+    }
+    blocks = []
+    offset = 0
+
+    for name in names:
+        with np.load(os.path.join(source_dir, f'{name}.npz')) as move:
+            joints = list(move.keys())
+            values = [move[j] for j in joints]
+
+        shapes = {v.shape for v in values}
+        if len(shapes) != 1:
+            raise ValueError(f'The joints of move {name} do not all have the same shape.')
+        shape = shapes.pop()
+
+        block = np.stack(values).astype(np.float32)
+        header['moves'][name] = {
+            'joints': joints,
+            'shape': list(shape),
+            'offset': offset,
+        }
+        blocks.append(block.ravel())
+        offset += block.size
+
+    write_packed(path, header, blocks)
+    return header
+
+
+class MoveArchive(object):
+    def __init__(self, path=archive_path):
+        self.path = path
+        self.header, self.data = read_packed(path)
+
+        if self.header['version'] != ARCHIVE_VERSION:
+            raise ValueError(f'Unsupported move archive version {self.header["version"]}.')
+
+    @property
+    def names(self):
+        return list(self.header['moves'])
+
+    @property
+    def freq(self):
+        return self.header['freq']
+
+    def move(self, name):
+        # Views on the mapped file, one per joint: nothing is read until used.
+        entry = self.header['moves'][name]
+        shape = tuple(entry['shape'])
+        size = int(np.prod(shape))
+        offset = entry['offset']
+
+        return {
+            joint: self.data[offset + i * size:offset + (i + 1) * size].reshape(shape)
+            for i, joint in enumerate(entry['joints'])
+        }
+
+
+def is_up_to_date(path=archive_path, source_dir=dir_path):
+    # The archive is used as long as it holds the .npz moves as they are
+    # (or when they are not there at all, e.g. only the archive was deployed).
+    if not os.path.exists(path):
+        return False
+
+    header, _ = read_packed(path)
+    if header.get('version') != ARCHIVE_VERSION:
+        return False
+
+    names = npz_names(source_dir)
+    if not names:
+        return True
+
+    return header['sources'] == sources_digest(names, source_dir, header['freq'])
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Pack the .npz moves into a single memory mapped archive.',
+    )
+    parser.add_argument('--source-dir', default=dir_path)
+    parser.add_argument('--output', default=archive_path)
+    parser.add_argument('--freq', type=int, default=100, help='Sample rate of the recorded moves.')
+    args = parser.parse_args()
+
+    tic = time.time()
+    header = pack_moves(path=args.output, source_dir=args.source_dir, freq=args.freq)
+
+    print(f'{len(header["moves"])} moves written to {args.output} '
+          f'({os.path.getsize(args.output) / 1e6:.1f}MB) in {time.time() - tic:.2f}s.')
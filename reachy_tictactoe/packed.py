@@ -0,0 +1,35 @@
+import json
+import struct
+import numpy as np
+
+
+# Layout of the packed files: the length of a JSON header (uint64), the
+# header, padding up to a multiple of 64 bytes, then float32 data. The
+# header gives the offsets (in number of floats) of what is stored.
+_header_size = struct.Struct('<Q')
+_alignment = 64
+
+
+def _data_offset(header_length):
+    return -(-(_header_size.size + header_length) // _alignment) * _alignment
+
+
+def write_packed(path, header, blocks):
+    raw_header = json.dumps(header).encode()
+    padding = _data_offset(len(raw_header)) - _header_size.size - len(raw_header)
+
+    with open(path, 'wb') as f:
+        f.write(_header_size.pack(len(raw_header)))
+        f.write(raw_header)
+        f.write(b'\0' * padding)
+        for block in blocks:
+            f.write(np.ascontiguousarray(block, dtype='<f4').tobytes())
+
+
+def read_packed(path):
+    with open(path, 'rb') as f:
+        header_length, = _header_size.unpack(f.read(_header_size.size))
+        header = json.loads(f.read(header_length))
+
+    data = np.memmap(path, dtype='<f4', mode='r', offset=_data_offset(header_length))
+    return header, data
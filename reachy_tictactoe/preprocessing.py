@@ -0,0 +1,87 @@
+import numpy as np
+import cv2 as cv
+
+
+class CropPreprocessor(object):
+    def __init__(self, input_size, max_crops):
+        h, w = input_size
+
+        self.input_size = input_size
+        self.buffer = np.empty((max_crops, h, w, 3), dtype=np.uint8)
+
+    def __call__(self, img, rects):
+        return self.crop_all([(img, rects)])
+
+    def crop_all(self, sources):
+        # sources is a list of (img, rects): the crops of all the images
+        # share the same buffer and color conversion.
+        h, w = self.input_size
+        n = sum(len(rects) for _, rects in sources)
+
+        if n > len(self.buffer):
+            self.buffer = np.empty((n, h, w, 3), dtype=np.uint8)
+
+        batch = self.buffer[:n]
+
+        # Each region is resized straight into its slot of the model input
+        # buffer, then the whole batch is converted to RGB in a single call.
+        i = 0
+        for img, rects in sources:
+            for lx, rx, ly, ry in rects:
+                cv.resize(img[ly:ry, lx:rx], (w, h), dst=batch[i], interpolation=cv.INTER_NEAREST)
+                i += 1
+
+        if n:
+            flat = batch.reshape(n * h, w, 3)
+            cv.cvtColor(flat, cv.COLOR_BGR2RGB, dst=flat)
+
+        return batch
+
+
+class RoiPyramid(object):
+    def __init__(self, img, rect, nb_levels=4):
+        # Successively half sized copies (cv.pyrDown) of a region of the frame.
+        # They are computed on demand and shared by all the stages working on the frame.
+        lx, rx, ly, ry = rect
+
+        self.rect = rect
+        self.nb_levels = nb_levels
+        self.levels = [img[ly:ry, lx:rx]]
+        self._gray = {}
+
+    def level(self, level):
+        if not 0 <= level < self.nb_levels:
+            raise ValueError(f'Pyramid level should be in [0, {self.nb_levels}), got {level}.')
+
+        while len(self.levels) <= level:
+            self.levels.append(cv.pyrDown(self.levels[-1]))
+
+        return self.levels[level]
+
+    def gray(self, level):
+        if level not in self._gray:
+            self._gray[level] = cv.cvtColor(self.level(level), cv.COLOR_BGR2GRAY)
+        return self._gray[level]
+
+    def crop(self, rect, level=0, gray=False):
+        # rect is in the frame coordinates and must lie within the pyramid's region.
+        lx, rx, ly, ry = self._level_rect(rect, level)
+        img = self.gray(level) if gray else self.level(level)
+        return img[ly:ry, lx:rx]
+
+    def origin(self, rect, level=0):
+        # Frame coordinates of the top left corner of the crop of rect at level.
+        lx, _, ly, _ = self._level_rect(rect, level)
+        return lx * 2 ** level + self.rect[0], ly * 2 ** level + self.rect[2]
+
+    def _level_rect(self, rect, level):
+        plx, prx, ply, pry = self.rect
+        lx, rx, ly, ry = rect
+
+        if lx < plx or rx > prx or ly < ply or ry > pry:
+            raise ValueError(f'{tuple(rect)} is not within the pyramid region {tuple(self.rect)}.')
+
+        return (
+            (lx - plx) >> level, (rx - plx) >> level,
+            (ly - ply) >> level, (ry - ply) >> level,
+        )
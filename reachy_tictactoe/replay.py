@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import shutil
+import logging
+import tempfile
+import numpy as np
+import cv2 as cv
+
+from concurrent.futures import ProcessPoolExecutor
+
+from . import vision
+from .benchmark import list_frames, report
+
+
+stages = ('load', 'view', 'preprocess', 'validity', 'cells', 'total')
+
+
+def setup(backend=None, num_threads=None, calibration=None):
+    # Each process works on its own copy of the calibration, so replaying
+    # frames never alters the one used by the robot.
+    calibration_path = os.path.join(tempfile.mkdtemp(prefix='ttt-replay-'), 'board-calibration.npz')
+    if calibration is not None and os.path.exists(calibration):
+        shutil.copy(calibration, calibration_path)
+
+    vision.use_backend(backend, num_threads)
+    vision.use_calibration(calibration_path)
+
+
+def analyze_file(path):
+    tic = time.time()
+    img = cv.imread(path)
+    load = time.time() - tic
+
+    if img is None:
+        return os.path.basename(path), None
+
+    analysis = vision.analyze_frame(img)
+
+    return os.path.basename(path), {
+        'valid': bool(analysis.valid),
+        'validity_score': analysis.validity_score,
+        'board': analysis.board.tolist() if analysis.valid else None,
+        'timings': dict(analysis.timings, load=load),
+    }
+
+
+def replay(files, backend=None, num_threads=None, calibration=None, workers=1):
+    if workers > 1:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=setup,
+            initargs=(backend, num_threads, calibration),
+        ) as pool:
+            # The first frame also loads the models of its worker.
+            return dict(pool.map(analyze_file, files, chunksize=4))
+
+    setup(backend, num_threads, calibration)
+    return dict(analyze_file(f) for f in files)
+
+
+def accuracy(results, labels):
+    # Labels are {frame name: {'valid': bool, 'board': 3x3 pieces (or None)}},
+    # as written by --save-labels.
+    labelled = [n for n in results if n in labels and results[n] is not None]
+    if not labelled:
+        print('No labelled frame.')
+        return
+
+    valid_ok = [results[n]['valid'] == labels[n]['valid'] for n in labelled]
+    print(f'Validity accuracy: {100 * np.mean(valid_ok):.1f}% ({len(labelled)} frames)')
+
+    boards = [
+        (np.array(results[n]['board']), np.array(labels[n]['board']))
+        for n in labelled
+        if results[n]['valid'] and labels[n]['valid'] and labels[n].get('board') is not None
+    ]
+    if not boards:
+        return
+
+    correct = np.array([pred == true for pred, true in boards])
+    print(f'Board accuracy: {100 * np.mean(correct.all(axis=(1, 2))):.1f}% ({len(boards)} boards)')
+    print('Per cell accuracy (human point of view):')
+    for row in 100 * correct.mean(axis=0):
+        print('  ' + '  '.join(f'{acc:5.1f}%' for acc in row))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Replay the vision pipeline over recorded camera frames.',
+    )
+    parser.add_argument('frames', help='Directory of recorded camera frames.')
+    parser.add_argument('--labels', help='JSON file of the expected validity and board of each frame.')
+    parser.add_argument('--save-labels', help='Write the predictions as a labels file (to be reviewed).')
+    parser.add_argument('--backend', choices=['edgetpu', 'cpu', 'stub'])
+    parser.add_argument('--num-threads', type=int)
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of worker processes (the Edge TPU can only be used by one).')
+    parser.add_argument('--calibration', default=vision.default_calibration_path,
+                        help='Board calibration to start from (it is not modified).')
+    parser.add_argument('--limit', type=int)
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    if args.verbose:
+        logging.basicConfig(level=logging.INFO)
+
+    files = list_frames(args.frames, args.limit)
+    if not files:
+        raise SystemExit(f'No frame found in "{args.frames}".')
+
+    tic = time.time()
+    results = replay(files, args.backend, args.num_threads, args.calibration, args.workers)
+    duration = time.time() - tic
+
+    analyzed = [r for r in results.values() if r is not None]
+    print(f'{len(analyzed)}/{len(files)} frames analyzed in {duration:.2f}s '
+          f'({len(analyzed) / duration:.1f} fps, {args.workers} worker(s))')
+    print(f'Valid boards: {sum(r["valid"] for r in analyzed)}/{len(analyzed)}')
+
+    for stage in stages:
+        latencies = [r['timings'][stage] for r in analyzed if stage in r['timings']]
+        if latencies:
+            report(stage, latencies)
+
+    if args.labels is not None:
+        with open(args.labels) as f:
+            accuracy(results, json.load(f))
+
+    if args.save_labels is not None:
+        with open(args.save_labels, 'w') as f:
+            json.dump({
+                name: {'valid': r['valid'], 'board': r['board']}
+                for name, r in results.items() if r is not None
+            }, f, indent=2, sort_keys=True)
@@ -0,0 +1,91 @@
+import time
+import logging
+
+from threading import Lock, Thread
+
+
+logger = logging.getLogger('reachy.tictactoe.resources')
+
+
+class LazyResource(object):
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+
+        self._lock = Lock()
+        self._loaded = False
+        self._value = None
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def get(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    tic = time.time()
+                    self._value = self.loader()
+                    self._loaded = True
+
+                    logger.info('Resource loaded', extra={
+                        'resource': self.name,
+                        'duration': time.time() - tic,
+                    })
+
+        return self._value
+
+    def set_loader(self, loader):
+        with self._lock:
+            self.loader = loader
+            self._loaded = False
+            self._value = None
+
+
+_registry = {}
+
+
+def register(name, loader):
+    resource = LazyResource(name, loader)
+    _registry[name] = resource
+    return resource
+
+
+def get(name):
+    return _registry[name].get()
+
+
+def warmup(names=None, background=False):
+    if names is None:
+        names = list(_registry.keys())
+
+    errors = []
+
+    def _warmup():
+        # A resource failing to load is logged right away (rather than at its
+        # first use in the game) and does not keep the others from loading.
+        tic = time.time()
+        for name in names:
+            try:
+                _registry[name].get()
+            except Exception as e:
+                logger.error('Resource failed to load', exc_info=True, extra={
+                    'resource': name,
+                    'error': e,
+                })
+                errors.append(e)
+        logger.info('Resources warmed up', extra={
+            'resources': names,
+            'failed': len(errors),
+            'duration': time.time() - tic,
+        })
+
+    if not background:
+        _warmup()
+        if errors:
+            raise errors[0]
+        return
+
+    t = Thread(target=_warmup, daemon=True)
+    t.start()
+    return t
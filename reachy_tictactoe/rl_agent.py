@@ -1,28 +1,29 @@
-import os
-import operator
 import numpy as np
 
+from . import resources
+from .board_encoding import powers
+from .board_state import board_code
+from .solver import load_table, VALUE, POLICY
 
-q = os.path.join(os.path.dirname(__file__), 'Q-value.npz')
-Q = np.load(q)
 
-Q = {1: Q['QX'], 2: Q['QO']}
+table = resources.register('solver_table', load_table)
 
 
 def value_actions(board, next_player=1):
-    possible_actions = np.where(np.array(board) == 0)[0]
+    values = table.get()[next_player - 1, VALUE]
 
-    possibilities = {}
-    for action in possible_actions:
-        next_board = board.copy()
-        next_board[action] = next_player
+    # All candidate next boards are scored with a single gather:
+    # placing a piece on an empty cell just adds player * 3^k to the code.
+    possible_actions = np.flatnonzero(np.asarray(board) == 0)
+    next_codes = board_code(board) + next_player * powers[possible_actions]
+    vals = values[next_codes]
 
-        val = Q[next_player][tuple(next_board)]
-        possibilities[action] = val
+    order = np.argsort(vals, kind='stable')
+    if next_player == 1:
+        order = order[::-1]
 
-    possibilities = sorted(possibilities.items(), key=operator.itemgetter(1))
+    return list(zip(possible_actions[order], vals[order]))
 
-    if next_player == 1:
-        possibilities = list(reversed(possibilities))
 
-    return possibilities
+def best_action(board, next_player=1):
+    return table.get()[next_player - 1, POLICY, board_code(board)]
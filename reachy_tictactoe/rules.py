@@ -0,0 +1,74 @@
+import numpy as np
+
+from . import resources
+from .board_encoding import NB_BOARDS, decode
+from .board_state import board_code
+from .utils import piece2id, id2piece, piece2player
+
+
+win_configurations = np.array((
+    (0, 1, 2),
+    (3, 4, 5),
+    (6, 7, 8),
+
+    (0, 3, 6),
+    (1, 4, 7),
+    (2, 5, 8),
+
+    (0, 4, 8),
+    (2, 4, 6),
+))
+
+outcome_dtype = np.dtype([
+    ('winner', np.uint8),
+    ('terminal', np.bool_),
+    ('legal_moves', np.uint16),
+    ('nb_cubes', np.uint8),
+    ('nb_cylinders', np.uint8),
+])
+
+winner_players = [piece2player[id2piece[i]] for i in range(3)]
+
+
+def build_outcomes():
+    boards = decode(np.arange(NB_BOARDS))
+    lines = boards[:, win_configurations]
+
+    # The winner is given by the first complete line (as the set based check).
+    complete = (
+        (lines[..., 0] != piece2id['none']) &
+        (lines[..., 0] == lines[..., 1]) &
+        (lines[..., 1] == lines[..., 2])
+    )
+    line_winner = np.where(complete, lines[..., 0], 0)
+
+    outcomes = np.zeros(NB_BOARDS, dtype=outcome_dtype)
+    outcomes['winner'] = line_winner[np.arange(NB_BOARDS), complete.argmax(axis=1)]
+
+    empty = boards == piece2id['none']
+    outcomes['terminal'] = (outcomes['winner'] != 0) | ~empty.any(axis=1)
+    outcomes['legal_moves'] = empty @ (1 << np.arange(9))
+    outcomes['nb_cubes'] = (boards == piece2id['cube']).sum(axis=1)
+    outcomes['nb_cylinders'] = (boards == piece2id['cylinder']).sum(axis=1)
+
+    return outcomes
+
+
+outcomes = resources.register('outcomes', build_outcomes)
+
+
+def outcome(board):
+    return outcomes.get()[board_code(board)]
+
+
+def get_winner(board):
+    return winner_players[outcomes.get()['winner'][board_code(board)]]
+
+
+def is_final(board):
+    return bool(outcomes.get()['terminal'][board_code(board)])
+
+
+def legal_moves(board):
+    mask = int(outcomes.get()['legal_moves'][board_code(board)])
+    return [i for i in range(9) if mask & (1 << i)]
@@ -0,0 +1,587 @@
+import time
+import zlib
+import heapq
+import logging
+import tempfile
+import numpy as np
+
+from . import inference, motion_cache, tictactoe_playground, vision
+from .board_state import BoardState
+from .calibration import BoardCalibration
+from .camera import Frame
+from .clock import VirtualClock
+from .inference import read_label_file
+from .moves import moves, base_pos
+from .snapshots import SnapshotRecorder
+from .trajectory import minjerk
+from .utils import piece2id
+from . import rules
+
+
+logger = logging.getLogger('reachy.tictactoe.simulation')
+
+
+# The simulated world colors (RGB) and the ones each label of the color classifier stands for.
+colors = {
+    'table': (120, 90, 60),
+    'board': (230, 230, 230),
+    'cube': (200, 40, 40),
+    'cylinder': (40, 60, 200),
+    'hand': (225, 170, 140),
+}
+
+label_colors = {
+    'none': ['board'],
+    'cube': ['cube'],
+    'cylinder': ['cylinder'],
+    'valid': ['board', 'cube', 'cylinder'],
+    'invalid': ['table', 'hand'],
+}
+
+
+class ColorBackend(object):
+    # Classifies the simulated camera crops from their pixels colors, in place
+    # of the board models (which can not make sense of the rendered frames).
+    name = 'color'
+    model_suffix = '.txt'
+
+    def __init__(self, model, input_size=(16, 16), **kwargs):
+        self.input_size = input_size
+
+        labels = read_label_file(model)
+        self.nb_labels = len(labels)
+
+        self._colors = np.array(list(colors.values()), dtype=np.float32)
+        # Color index -> label (or -1 for the colors no label stands for).
+        self._color_labels = np.full(len(colors), -1)
+        for label_id, label in labels.items():
+            for color in label_colors[label]:
+                self._color_labels[list(colors).index(color)] = label_id
+
+    def predict(self, batch):
+        pixels = batch.reshape(len(batch), -1, 1, 3).astype(np.float32)
+        nearest = np.abs(pixels - self._colors).sum(axis=-1).argmin(axis=-1)
+        labels = self._color_labels[nearest]
+
+        # Probabilities are the share of the pixels of each label's colors.
+        counts = np.stack([(labels == i).sum(axis=1) for i in range(self.nb_labels)], axis=1)
+        return (counts + 1) / (counts.sum(axis=1, keepdims=True) + self.nb_labels)
+
+
+class SimulatedWorld(object):
+    def __init__(self, clock, rng, think_time=(0.5, 2.0), hand_time=0.5,
+                 clear_delay=(1.0, 3.0), clear_time=(2.0, 4.0),
+                 cheat_probability=0.0, frame_size=(1080, 960)):
+        self.clock = clock
+        self.rng = rng
+        # Scripted human: thinks, puts a hand over the board and plays a random move.
+        self.think_time = think_time
+        self.hand_time = hand_time
+        # The board is cleared clear_delay after the game is over, in clear_time.
+        self.clear_delay = clear_delay
+        self.clear_time = clear_time
+        self.cheat_probability = cheat_probability
+        self.frame_size = frame_size
+
+        self.board = BoardState()
+        self.hand = False
+        self.looking_at_board = False
+
+        self._events = []
+        self._seq = 0
+        # Clearing the board cancels the pending human moves.
+        self._epoch = 0
+        self._clearing = False
+        self._render_cache = None
+        self._backgrounds = {}
+
+        self.nb_human_moves = 0
+        self.nb_robot_moves = 0
+        self.nb_cheats = 0
+        self.nb_clears = 0
+
+    @property
+    def stats(self):
+        return {
+            'human_moves': self.nb_human_moves,
+            'robot_moves': self.nb_robot_moves,
+            'cheats': self.nb_cheats,
+            'clears': self.nb_clears,
+        }
+
+    def schedule(self, delay, action):
+        heapq.heappush(self._events, (self.clock.time() + delay, self._seq, self._epoch, action))
+        self._seq += 1
+
+    def update(self):
+        now = self.clock.time()
+        while self._events and self._events[0][0] <= now:
+            _, _, epoch, action = heapq.heappop(self._events)
+            if epoch == self._epoch:
+                action()
+
+        # The human clears the board once the game is over.
+        if not self._clearing and not self.board.is_empty() and self._game_over():
+            self.clear_board()
+
+    def _game_over(self):
+        return rules.is_final(self.board) or not self.board.is_coherent()
+
+    def human_turn(self):
+        think = self.rng.uniform(*self.think_time)
+        self.schedule(think, self._hand_on)
+        self.schedule(think + self.hand_time, self._human_plays)
+
+    def _hand_on(self):
+        self.hand = True
+
+    def _human_plays(self):
+        self.hand = False
+        if self._game_over():
+            return
+
+        empty = [i for i, p in enumerate(self.board) if p == piece2id['none']]
+        nb_pieces = 2 if len(empty) > 1 and self.rng.rand() < self.cheat_probability else 1
+        for cell in self.rng.choice(empty, size=nb_pieces, replace=False):
+            self.board = self.board.place(int(cell), piece2id['cube'])
+
+        self.nb_human_moves += 1
+        self.nb_cheats += nb_pieces - 1
+
+    def robot_places(self, cell):
+        self.update()
+        self.board = self.board.place(cell, piece2id['cylinder'])
+        self.nb_robot_moves += 1
+
+        if not self._game_over():
+            self.human_turn()
+
+    def clear_board(self):
+        self._epoch += 1
+        self._clearing = True
+
+        def _cleared():
+            self.board = BoardState()
+            self.hand = False
+            self._clearing = False
+            self.nb_clears += 1
+
+        delay = self.rng.uniform(*self.clear_delay)
+        self.schedule(delay, self._hand_on)
+        self.schedule(delay + self.rng.uniform(*self.clear_time), _cleared)
+
+    def render(self):
+        # Frames only change with the world state, so they are rendered once per state.
+        key = (self.board, self.hand, self.looking_at_board)
+        if self._render_cache is not None and self._render_cache[0] == key:
+            return self._render_cache[1]
+
+        bgr = {name: color[::-1] for name, color in colors.items()}
+        cells = vision.board_cases.reshape(-1, 4)
+        lx, rx, ly, ry = vision.board_rect
+
+        if self.looking_at_board not in self._backgrounds:
+            background = np.empty(self.frame_size + (3, ), dtype=np.uint8)
+            background[:] = bgr['table']
+            if self.looking_at_board:
+                background[min(ly, cells[:, 2].min()):ry, min(lx, cells[:, 0].min()):rx] = bgr['board']
+            self._backgrounds[self.looking_at_board] = background
+
+        img = self._backgrounds[self.looking_at_board].copy()
+
+        if self.looking_at_board:
+            # The cells rects are in the camera order, i.e. the board seen from the robot.
+            for piece, (clx, crx, cly, cry) in zip(list(self.board)[::-1], cells):
+                if piece != piece2id['none']:
+                    name = 'cube' if piece == piece2id['cube'] else 'cylinder'
+                    img[cly + 3:cry - 3, clx + 3:crx - 3] = bgr[name]
+
+            if self.hand:
+                img[ly + (ry - ly) // 3:ry, lx:rx] = bgr['hand']
+                img[cells[:, 2].min():ly + (ry - ly) // 3, lx + (rx - lx) // 3:rx] = bgr['hand']
+
+        self._render_cache = (key, img)
+        return img
+
+
+class SimulatedMotor(object):
+    def __init__(self, name, clock, ambient=30.0, holding_rise=14.0, motion_rise=12.0,
+                 time_constant=600.0):
+        self.name = name
+        self.alias = name.split('.')[-1]
+        self.clock = clock
+
+        self.goal_position = 0.0
+        self.torque_limit = 100.0
+
+        # First order thermal model: the temperature goes towards ambient plus
+        # a rise when stiff (and more while moving) with time_constant.
+        self.ambient = ambient
+        self.holding_rise = holding_rise
+        self.motion_rise = motion_rise
+        self.time_constant = time_constant
+
+        self._compliant = True
+        self._temperature = ambient
+        self._last_update = clock.time()
+        self._moving_until = -np.inf
+
+    @property
+    def present_position(self):
+        return self.goal_position
+
+    @property
+    def rot_position(self):
+        return self.goal_position
+
+    @property
+    def compliant(self):
+        return self._compliant
+
+    @compliant.setter
+    def compliant(self, compliant):
+        self._update_temperature()
+        self._compliant = compliant
+
+    @property
+    def temperature(self):
+        self._update_temperature()
+        return self._temperature
+
+    def goto(self, goal_position, duration, wait=False, **kwargs):
+        self.move(goal_position, duration)
+        if wait:
+            self.clock.sleep(duration, 'motion')
+
+    def move(self, goal_position, duration):
+        self._update_temperature()
+        self.goal_position = float(goal_position)
+        self._moving_until = self.clock.time() + duration
+
+    def _update_temperature(self):
+        now = self.clock.time()
+
+        if self._moving_until > self._last_update:
+            end = min(now, self._moving_until)
+            self._heat(end - self._last_update, moving=True)
+            self._last_update = end
+
+        self._heat(now - self._last_update, moving=False)
+        self._last_update = now
+
+    def _heat(self, dt, moving):
+        if dt <= 0:
+            return
+
+        target = self.ambient
+        if not self._compliant:
+            target += self.holding_rise + (self.motion_rise if moving else 0)
+
+        self._temperature = target + (self._temperature - target) * np.exp(-dt / self.time_constant)
+
+
+class SimulatedCamera(object):
+    def __init__(self, world):
+        self.world = world
+
+    def read(self):
+        self.world.update()
+        return True, self.world.render()
+
+
+class SimulatedFrameGrabber(object):
+    # Same interface as camera.FrameGrabber, with frames taken every period
+    # of virtual time and no background thread.
+    def __init__(self, camera, clock, period=1 / 15):
+        self.camera = camera
+        self.clock = clock
+        self.period = period
+
+        self.nb_frames = 0
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    @property
+    def stats(self):
+        return {'frames': self.nb_frames, 'dropped': 0, 'failed_reads': 0}
+
+    def latest(self):
+        return self._grab(self._frame_number(self.clock.time()))
+
+    def wait_for_frame_after(self, t, timeout=None):
+        n = max(self._frame_number(self.clock.time()), self._frame_number(t) + 1)
+        self.clock.sleep(n * self.period - self.clock.time(), 'camera')
+        return self._grab(n)
+
+    def _frame_number(self, t):
+        # Number of the last frame taken at t (frames are taken at n * period).
+        return int(np.floor(t / self.period + 1e-6))
+
+    def _grab(self, n):
+        _, img = self.camera.read()
+        frame = Frame(self.nb_frames, n * self.period, img)
+        self.nb_frames += 1
+        return frame
+
+
+class SimulatedHand(object):
+    def __init__(self, reachy):
+        self.reachy = reachy
+
+    def close(self):
+        self.reachy.right_arm.gripper.goto(-10, 0.5, wait=True)
+
+    def open(self):
+        self.reachy.right_arm.gripper.goto(-45, 0.5, wait=True)
+
+        # The pawn is dropped in the box where a put move ends, if the arm is there.
+        arm = {m.name: m.goal_position for m in self.reachy.right_arm.motors}
+        for box in range(1, 10):
+            put = moves[f'put_{box}_smooth_10_kp']
+            if all(abs(arm[m] - np.ravel(traj)[-1]) < 1e-3
+                   for m, traj in put.items() if not m.endswith('gripper')):
+                self.reachy.world.robot_places(box - 1)
+                break
+
+
+class SimulatedPart(object):
+    def __init__(self, motors):
+        self.motors = motors
+        for m in motors:
+            setattr(self, m.alias, m)
+
+
+class SimulatedHead(SimulatedPart):
+    def __init__(self, clock, world):
+        SimulatedPart.__init__(self, [
+            SimulatedMotor('head.left_antenna', clock, holding_rise=5.0, motion_rise=5.0),
+            SimulatedMotor('head.right_antenna', clock, holding_rise=5.0, motion_rise=5.0),
+        ])
+        self.clock = clock
+        self.world = world
+
+        self.neck = SimulatedPart([
+            SimulatedMotor(f'head.neck.disk_{d}', clock, holding_rise=8.0, motion_rise=15.0)
+            for d in ('top', 'middle', 'bottom')
+        ])
+        self.neck.disks = self.neck.motors
+        self.neck.orient = self._orient
+
+        self.right_camera = SimulatedCamera(world)
+
+    @property
+    def compliant(self):
+        return all(m.compliant for m in self.neck.disks + self.motors)
+
+    @compliant.setter
+    def compliant(self, compliant):
+        for m in self.neck.disks + self.motors:
+            m.compliant = compliant
+
+    def look_at(self, x, y, z, duration, wait):
+        # The board is in the camera's field of view when looking down at it.
+        self.world.looking_at_board = z <= -0.5
+        self._orient(None, duration, wait)
+
+    def _orient(self, q, duration, wait):
+        for disk in self.neck.disks:
+            disk.move(disk.goal_position, duration)
+        if wait:
+            self.clock.sleep(duration, 'motion')
+
+
+class SimulatedReachy(object):
+    def __init__(self, clock, world):
+        self.clock = clock
+        self.world = world
+
+        self.head = SimulatedHead(clock, world)
+
+        arm_motors = [SimulatedMotor(name, clock) for name in base_pos]
+        self.right_arm = SimulatedPart(arm_motors)
+        self.right_arm.hand = SimulatedHand(self)
+        self.right_arm.forward_kinematics = lambda joints: np.eye(4)
+
+        self.motors = arm_motors + self.head.motors
+        self._motors = {m.name: m for m in self.motors}
+
+        self._trajectory_names = None
+
+    def goto(self, goal_positions, duration, wait=False, **kwargs):
+        for name, position in goal_positions.items():
+            if name in self._motors:
+                self._motors[name].move(np.ravel(position)[0], duration)
+        if wait:
+            self.clock.sleep(duration, 'motion')
+
+    def trajectory_name(self, trajectory):
+        # Moves are loaded once, so they can be recognized by identity.
+        if self._trajectory_names is None:
+            self._trajectory_names = {id(moves[name]): name for name in moves}
+        return self._trajectory_names.get(id(trajectory))
+
+    def close(self):
+        pass
+
+
+class SimulatedTrajectoryPlayer(object):
+    def __init__(self, reachy, trajectory, freq=100):
+        self.reachy = reachy
+        self.trajectory = trajectory
+        self.freq = freq
+
+    def play(self, wait=False):
+        name = self.reachy.trajectory_name(self.trajectory)
+        duration = len(next(iter(self.trajectory.values()))) / self.freq
+
+        self.reachy.goto({
+            motor: traj[-1] for motor, traj in self.trajectory.items()
+        }, duration=duration, wait=wait)
+
+        if name == 'your-turn':
+            self.reachy.world.human_turn()
+        elif name == 'shuffle-board':
+            self.reachy.world.clear_board()
+
+
+def synthetic_move(name):
+    # Stand-in for a recorded move whose file is not available (e.g. a git
+    # LFS pointer): positions around the base one, or a few seconds long
+    # trajectories between two of them. The same name always gives the same move.
+    durations = {'put': 2.0, 'shuffle-board': 6.0, 'my-turn': 3.0, 'your-turn': 3.0}
+    duration = next((d for prefix, d in durations.items() if name.startswith(prefix)), None)
+    rng = np.random.RandomState(zlib.crc32(name.encode()))
+
+    def position():
+        return np.array([
+            pos + (0 if motor.endswith('gripper') else rng.uniform(-20, 20))
+            for motor, pos in base_pos.items()
+        ])
+
+    if duration is None:
+        return {motor: np.array([pos]) for motor, pos in zip(base_pos, position())}
+
+    start, end = position(), position()
+    s = minjerk(np.linspace(0, 1, int(duration * 100)))[:, np.newaxis]
+    trajectory = (start + (end - start) * s).astype(np.float32)
+    return {motor: trajectory[:, i] for i, motor in enumerate(base_pos)}
+
+
+def use_synthetic_moves():
+    synthetic = False
+    for name in moves:
+        try:
+            moves[name]
+        except (OSError, ValueError):
+            moves.set_loader(name, lambda name=name: synthetic_move(name))
+            synthetic = True
+
+    # The compiled trajectories would not match the synthetic moves.
+    if synthetic:
+        motion_cache.cache.set_loader(lambda: None)
+
+
+class Simulation(object):
+    def __init__(self, seed=None, camera_period=1 / 15, **human):
+        self.clock = VirtualClock()
+        self.rng = np.random.RandomState(seed)
+        self.world = SimulatedWorld(self.clock, self.rng, **human)
+        self.reachy = SimulatedReachy(self.clock, self.world)
+        self.frame_grabber = SimulatedFrameGrabber(
+            self.reachy.head.right_camera, self.clock, camera_period,
+        )
+
+    def install(self):
+        # Process wide: the vision uses the color classifier on the rendered frames.
+        inference.backends[ColorBackend.name] = ColorBackend
+        vision.use_backend(ColorBackend.name)
+
+        calibration_path = tempfile.mkdtemp(prefix='ttt-simulation-')
+        vision.calibration.set_loader(lambda: BoardCalibration(
+            path=f'{calibration_path}/board-calibration.npz',
+            reference_cases=vision.board_cases,
+            retry_period=None,
+        ))
+
+        use_synthetic_moves()
+
+    def playground(self):
+        return tictactoe_playground.TictactoePlayground(
+            reachy=self.reachy,
+            trajectory_player=SimulatedTrajectoryPlayer,
+            frame_grabber=self.frame_grabber,
+            snapshots=SnapshotRecorder(directory=None),
+            clock=self.clock,
+        )
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from .game_launcher import run_games
+
+    parser = argparse.ArgumentParser(
+        description='Play full games against a scripted human on a simulated Reachy.',
+    )
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--camera-period', type=float, default=1 / 15)
+    parser.add_argument('--cheat-probability', type=float, default=0.0)
+    parser.add_argument('--serial-turns', action='store_true', help='Do not overlap the arm and head moves.')
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level)
+    np.random.seed(args.seed)
+
+    simulation = Simulation(
+        seed=args.seed,
+        camera_period=args.camera_period,
+        cheat_probability=args.cheat_probability,
+    )
+    simulation.install()
+
+    with simulation.playground() as playground:
+        playground.pipelined_turns = not args.serial_turns
+        playground.setup()
+
+        tic = time.time()
+        stats = run_games(playground, args.games)
+        duration = time.time() - tic
+
+    print(f'{args.games} games in {duration:.1f}s ({60 * args.games / duration:.0f} games/min)')
+    print(f'Virtual time: {simulation.clock.time() / args.games:.1f}s per game')
+    print(f'Winners: {stats["winners"]}, cooldowns: {stats["cooldowns"]}')
+    print(f'World: {simulation.world.stats}')
+    print(f'Camera: {simulation.frame_grabber.stats}')
+    vision = stats['vision']
+    checks = sum(vision[k] for k in (
+        'verified_moves', 'human_played_during_check', 'cleared_during_check',
+        'unseen_checks', 'unconfirmed_moves',
+    ))
+    if checks:
+        print('Robot move checks: {} ({:.1f}% confirmed), {}'.format(
+            checks,
+            100 * (vision['verified_moves'] + vision['human_played_during_check']) / checks,
+            ', '.join(f'{k} {vision[k]}' for k in (
+                'verified_moves', 'human_played_during_check', 'cleared_during_check',
+                'unseen_checks', 'unconfirmed_moves',
+            )),
+        ))
+    turns = playground.turn_profiles
+    if turns:
+        phases = max(turns, key=lambda t: len(t['phases']))['phases']
+        print('Robot turn: {:.2f}s ({})'.format(
+            np.mean([t['duration'] for t in turns]),
+            ', '.join(
+                f'{name} {np.mean([t["phases"][name] for t in turns if name in t["phases"]]):.2f}s'
+                for name in phases
+            ),
+        ))
+    print('Sleeps per game: {}'.format(', '.join(
+        f'{reason} {total / args.games:.1f}s' for reason, total in sorted(stats['sleeps'].items())
+    )))
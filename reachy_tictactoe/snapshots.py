@@ -0,0 +1,164 @@
+import os
+import re
+import logging
+import cv2 as cv
+
+from collections import deque
+from queue import Queue, Full
+from threading import Thread
+
+
+logger = logging.getLogger('reachy.tictactoe.snapshots')
+
+
+default_directory = os.getenv(
+    'REACHY_TICTACTOE_SNAPSHOTS',
+    '/tmp/reachy_tictactoe_snapshots',
+)
+
+
+class SnapshotRecorder(object):
+    def __init__(self, directory=default_directory, queue_size=8,
+                 max_files=1000, max_bytes=200 * 2 ** 20,
+                 scale=1.0, rect=None, quality=90, prefix='snap'):
+        self.directory = directory
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        # Optional capture of a region only (left, right, top, bottom) and downscaling.
+        self.scale = scale
+        self.rect = rect
+        self.quality = quality
+        self.prefix = prefix
+
+        self._queue = Queue(maxsize=queue_size)
+        self._files = deque()
+        self._bytes = 0
+        self._t = None
+
+        self.nb_recorded = 0
+        self.nb_dropped = 0
+        self.nb_removed = 0
+        self.nb_failed_writes = 0
+
+        self._pattern = re.compile(rf'^{re.escape(prefix)}\.(\d+)\.jpg$')
+        self._seq = 0
+
+    def start(self):
+        # No directory: the snapshots are disabled.
+        if not self.directory:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._scan()
+
+        logger.info('Starting the snapshot recorder', extra={
+            'directory': self.directory,
+            'next_index': self._seq,
+        })
+
+        self._t = Thread(target=self._write, daemon=True)
+        self._t.start()
+
+    def stop(self):
+        if self._t is None:
+            return
+
+        # The pending snapshots are written before the thread exits.
+        self._queue.put(None)
+        self._t.join()
+        self._t = None
+
+        logger.info('Snapshot recorder stopped', extra={
+            'stats': self.stats,
+        })
+
+    @property
+    def stats(self):
+        return {
+            'recorded': self.nb_recorded,
+            'dropped': self.nb_dropped,
+            'removed': self.nb_removed,
+            'failed_writes': self.nb_failed_writes,
+        }
+
+    def record(self, img):
+        # Returns the path the snapshot will be written to, or None when it
+        # was dropped (recorder not started or too many pending writes).
+        if self._t is None:
+            return None
+
+        path = os.path.join(self.directory, f'{self.prefix}.{self._seq:06d}.jpg')
+
+        try:
+            # The frame is not copied: the camera frames are never modified.
+            self._queue.put_nowait((path, img))
+        except Full:
+            self.nb_dropped += 1
+            return None
+
+        self._seq += 1
+        return path
+
+    def _scan(self):
+        # Existing snapshots are kept in the rotation and the numbering goes on after them.
+        existing = sorted(
+            (int(m.group(1)), f)
+            for f in os.listdir(self.directory)
+            for m in [self._pattern.match(f)] if m
+        )
+
+        for _, f in existing:
+            path = os.path.join(self.directory, f)
+            size = os.path.getsize(path)
+            self._files.append((path, size))
+            self._bytes += size
+
+        if existing:
+            self._seq = existing[-1][0] + 1
+
+        self._rotate()
+
+    def _write(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            path, img = item
+
+            if self.rect is not None:
+                lx, rx, ly, ry = self.rect
+                img = img[ly:ry, lx:rx]
+            if self.scale != 1.0:
+                img = cv.resize(img, None, fx=self.scale, fy=self.scale, interpolation=cv.INTER_AREA)
+
+            success, data = cv.imencode('.jpg', img, [cv.IMWRITE_JPEG_QUALITY, self.quality])
+            if not success:
+                self.nb_failed_writes += 1
+                continue
+
+            try:
+                with open(path, 'wb') as f:
+                    f.write(data)
+            except OSError as e:
+                self.nb_failed_writes += 1
+                logger.warning('Snapshot write failed', extra={'img_path': path, 'error': e})
+                continue
+
+            self._files.append((path, len(data)))
+            self._bytes += len(data)
+            self.nb_recorded += 1
+
+            self._rotate()
+
+    def _rotate(self):
+        # The oldest snapshots are removed once too many or too large.
+        while self._files and (len(self._files) > self.max_files or self._bytes > self.max_bytes):
+            path, size = self._files.popleft()
+            self._bytes -= size
+
+            try:
+                os.remove(path)
+                self.nb_removed += 1
+            except OSError:
+                pass
@@ -0,0 +1,124 @@
+import os
+import time
+import logging
+import numpy as np
+
+from .board_encoding import NB_BOARDS, canonical_code, encode
+
+
+logger = logging.getLogger('reachy.tictactoe.solver')
+
+
+TABLE_VERSION = 2
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+table_path = os.path.join(dir_path, f'ttt-solver-v{TABLE_VERSION}.npy')
+
+VALUE, POLICY = 0, 1
+
+win_configurations = (
+    (0, 1, 2),
+    (3, 4, 5),
+    (6, 7, 8),
+
+    (0, 3, 6),
+    (1, 4, 7),
+    (2, 5, 8),
+
+    (0, 4, 8),
+    (2, 4, 6),
+)
+
+
+def winner(board):
+    for a, b, c in win_configurations:
+        if board[a] != 0 and board[a] == board[b] == board[c]:
+            return board[a]
+    return 0
+
+
+def solve():
+    # Values are given from player 1 point of view: a win is worth more the
+    # sooner it happens, so the solver does not stall when it can finish.
+    # table[player - 1, VALUE, code] is the value of board right after player played.
+    # table[player - 1, POLICY, code] is the best action for player to move on board.
+    table = np.zeros((2, 2, NB_BOARDS), dtype=np.int8)
+    table[:, POLICY] = -1
+
+    cache = {}
+
+    def minimax(board, player):
+        key = (canonical_code(board), player)
+        if key in cache:
+            return cache[key]
+
+        w = winner(board)
+        empty = board.count(0)
+
+        if w != 0:
+            value = (1 + empty) * (1 if w == 1 else -1)
+        elif empty == 0:
+            value = 0
+        else:
+            other = 3 - player
+            values = [
+                minimax(board[:action] + (player, ) + board[action + 1:], other)
+                for action in range(9) if board[action] == 0
+            ]
+            value = max(values) if player == 1 else min(values)
+
+        cache[key] = value
+        return value
+
+    def fill(board, player, seen):
+        if (board, player) in seen:
+            return
+        seen.add((board, player))
+
+        if winner(board) != 0 or 0 not in board:
+            return
+
+        other = 3 - player
+        best_action, best_value = None, None
+
+        for action in range(9):
+            if board[action] != 0:
+                continue
+
+            next_board = board[:action] + (player, ) + board[action + 1:]
+            v = minimax(next_board, other)
+            table[player - 1, VALUE, encode(next_board)] = v
+
+            if (best_value is None or
+                    (player == 1 and v > best_value) or
+                    (player == 2 and v < best_value)):
+                best_action, best_value = action, v
+
+            fill(next_board, other, seen)
+
+        table[player - 1, POLICY, encode(board)] = best_action
+
+    seen = set()
+    empty_board = (0, ) * 9
+    for first_player in (1, 2):
+        fill(empty_board, first_player, seen)
+
+    return table
+
+
+def load_table(path=table_path):
+    return np.load(path, mmap_mode='r')
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output', default=table_path)
+    args = parser.parse_args()
+
+    tic = time.time()
+    table = solve()
+    np.save(args.output, table)
+
+    print(f'Solver table written to {args.output} in {time.time() - tic:.2f}s.')
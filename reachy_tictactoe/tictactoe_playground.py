@@ -1,44 +1,94 @@
 import numpy as np
 import logging
-import time
 import os
 
 
 from threading import Thread, Event
 
-from reachy import Reachy
-from reachy.parts import RightArm, Head
-from reachy.trajectory import TrajectoryPlayer
-
-from .vision import get_board_configuration, is_board_valid
-from .utils import piece2id, id2piece, piece2player
+from .vision import analyze_frame, board_pyramid, board_cells_rect
+from .utils import piece2id
+from .board_state import BoardState
+from .camera import FrameGrabber
+from .clock import PhaseTimer, real_clock
+from .change_detection import ChangeDetector, CHANGED, SETTLING
+from .fusion import BoardFusion
+from .snapshots import SnapshotRecorder
 from .moves import moves, rest_pos, base_pos
+from .motion_cache import play_pawn_trajectories
 from .rl_agent import value_actions
-from . import behavior
+from . import behavior, resources, rules
 
 
 logger = logging.getLogger('reachy.tictactoe')
 
 
 class TictactoePlayground(object):
-    def __init__(self):
+    def __init__(self, reachy=None, trajectory_player=None, frame_grabber=None, snapshots=None,
+                 clock=None):
+        # The robot parts can be replaced (e.g. by the simulated ones, see simulation.py).
         logger.info('Creating the playground')
 
-        self.reachy = Reachy(
-            right_arm=RightArm(
-                io='/dev/ttyUSB*',
-                hand='force_gripper',
-            ),
-            head=Head(
-                io='/dev/ttyUSB*',
-            ),
-        )
+        if reachy is None:
+            from reachy import Reachy
+            from reachy.parts import RightArm, Head
+
+            reachy = Reachy(
+                right_arm=RightArm(
+                    io='/dev/ttyUSB*',
+                    hand='force_gripper',
+                ),
+                head=Head(
+                    io='/dev/ttyUSB*',
+                ),
+            )
+
+        if trajectory_player is None:
+            from reachy.trajectory import TrajectoryPlayer
+            trajectory_player = TrajectoryPlayer
+
+        self.reachy = reachy
+        self.trajectory_player = trajectory_player
+        # All the waits go through the clock (see clock.py), tagged with their reason.
+        self.clock = clock if clock is not None else real_clock
 
         self.pawn_played = 0
+        self.nb_games = 0
+        self.frame_grabber = (
+            frame_grabber if frame_grabber is not None
+            else FrameGrabber(self.reachy.head.right_camera, clock=self.clock)
+        )
+        self.snapshots = snapshots if snapshots is not None else SnapshotRecorder()
+
+        self.board_gate = ChangeDetector(board_cells_rect)
+        self.board_fusion = BoardFusion()
+        self.max_fused_frames = 8
+        self.last_analyzed_board = None
+        # Last board confirmed during the current game (None outside of a game).
+        self.known_board = None
+        # Occupied cells are checked again every few classifications to catch cheating.
+        self.occupied_check_period = 4
+        self.head_on_board = False
+        self._pyramid = None
+        self.reset_vision_stats()
+
+        # The head aims at the board and checks the robot's move while the
+        # arm goes back to rest (one after the other if not pipelined).
+        self.pipelined_turns = True
+        # Longest wait for the board to be still, once aimed at, to check a move.
+        self.verify_timeout = 5.0
+        self.turn_timer = PhaseTimer(self.clock)
+        self.turn_profiles = []
+        # Board seen while checking the robot's move, other than the expected one.
+        self._seen_board = None
 
     def setup(self):
         logger.info('Setup the playground')
 
+        # Load the models, value table and moves while the robot moves.
+        warmup = resources.warmup(background=True)
+        self.frame_grabber.start()
+        self.snapshots.start()
+
         for antenna in self.reachy.head.motors:
             antenna.compliant = False
             antenna.goto(
@@ -47,6 +97,8 @@ class TictactoePlayground(object):
             )
         self.goto_rest_position()
 
+        warmup.join()
+
     def __enter__(self):
         return self
 
@@ -57,6 +109,8 @@ class TictactoePlayground(object):
                 'exc': exc,
             }
         )
+        self.frame_grabber.stop()
+        self.snapshots.stop()
         self.reachy.close()
 
     # Playground and game functions
@@ -65,12 +119,14 @@ class TictactoePlayground(object):
         logger.info('Resetting the playground')
 
         self.pawn_played = 0
-        empty_board = np.zeros((3, 3), dtype=np.uint8).flatten()
+        self.nb_games += 1
+        self.known_board = BoardState()
+        self._seen_board = None
 
-        return empty_board
+        return self.known_board
 
     def is_ready(self, board):
-        return np.sum(board) == 0
+        return board is not None and board.is_empty()
 
     def random_look(self):
         dy = 0.4
@@ -83,7 +139,7 @@ class TictactoePlayground(object):
 
     def run_random_idle_behavior(self):
         logger.info('Reachy is playing a random idle behavior')
-        time.sleep(2)
+        self.clock.sleep(2, 'idle')
 
     def coin_flip(self):
         coin = np.random.rand() > 0.5
@@ -95,64 +151,214 @@ class TictactoePlayground(object):
         )
         return coin
 
-    def analyze_board(self):
-        for disk in self.reachy.head.neck.disks:
-            disk.compliant = False
+    def analyze_board(self, force=False, keep_head_on_board=False):
+        if self.head_on_board:
+            self._vision_stats['saved_head_motions'] += 1
+        else:
+            self.look_at_board()
+
+        # Wait for an image taken once the head is on the board
+        frame = self.wait_for_frame(since=self.clock.time())
+
+        # Only run the classifiers when the board changed and is still
+        # (e.g. the hand left the board), otherwise keep the last result.
+        state = self.board_gate.update(self.frame_pyramid(frame), frame.timestamp)
+        deadline = frame.timestamp + 2 * self.board_gate.settle_time
+        while state == SETTLING and frame.timestamp < deadline:
+            frame = self.wait_for_frame(since=frame.timestamp)
+            state = self.board_gate.update(self.frame_pyramid(frame), frame.timestamp)
+
+        if state != CHANGED and not force and self.last_analyzed_board is not None:
+            self.board_gate.count(classified=False)
+            # Keep the head on the board: the next analysis won't have to move it again.
+            self._vision_stats['saved_head_motions'] += 1
+            return self.last_analyzed_board
+
+        self.board_gate.count(classified=True)
+        board = self.classify_frame(frame)
+        if not keep_head_on_board:
+            self.look_straight()
 
-        time.sleep(0.1)
+        return board
 
-        self.reachy.head.look_at(0.5, 0, z=-0.6, duration=1, wait=True)
-        time.sleep(0.2)
+    def watch_board(self, last_board):
+        # Keep the head on the board and stream the camera frames through
+        # the change detection until a new board is confirmed.
+        if not self.head_on_board:
+            self.look_at_board()
 
-        # Wait an image from the camera
-        self.wait_for_img()
-        success, img = self.reachy.head.right_camera.read()
+        logger.info('Watching the board', extra={
+            'last_board': last_board,
+        })
 
-        # TEMP:
-        import cv2 as cv
-        i = np.random.randint(1000)
-        path = f'/tmp/snap.{i}.jpg'
-        cv.imwrite(path, img)
+        board, self._seen_board = self._seen_board, None
+        if board is not None and board != last_board:
+            logger.info('New board detected', extra={
+                'board': board,
+                'latency': 0,
+            })
+            self.look_straight()
+            return board
+
+        since = self.clock.time()
+        while True:
+            frame = self.wait_for_frame(since=since)
+            since = frame.timestamp
+
+            if self.board_gate.update(self.frame_pyramid(frame), frame.timestamp) != CHANGED:
+                continue
+
+            changed_since = self.board_gate.changed_since
+            self.board_gate.count(classified=True)
+            board = self.classify_frame(frame)
+
+            if board is None or board == last_board:
+                continue
+
+            logger.info('New board detected', extra={
+                'board': board,
+                'latency': self.clock.time() - changed_since,
+            })
+
+            self.look_straight()
+            return board
+
+    def classify_frame(self, frame, check_occupied=False):
+        # Written in the background (or dropped if the disk can not keep up).
+        path = self.snapshots.record(frame.img)
 
         logger.info(
             'Getting an image from camera',
             extra={
                 'img_path': path,
+                'game': self.nb_games,
+                'turn': self.turn,
                 'disks': [d.rot_position for d in self.reachy.head.neck.disks],
             },
         )
 
-        if not is_board_valid(img):
-            self.reachy.head.compliant = False
-            time.sleep(0.1)
-            self.reachy.head.look_at(1, 0, 0, duration=0.75, wait=True)
+        known = self.known_board
+        self._nb_board_classifications += 1
+        check_occupied = check_occupied or self._nb_board_classifications % self.occupied_check_period == 0
+        nb_cells = 9 if known is None or check_occupied else 9 - known.nb_cubes - known.nb_cylinders
+
+        # Fuse the cells scores over consecutive frames from this viewpoint
+        # (starting with the validated one) until every cell is confident and stable.
+        self.board_fusion.reset()
+        for i in range(self.max_fused_frames):
+            # The validity is only checked on the first frame.
+            analysis = analyze_frame(
+                frame.img, known, check_occupied,
+                check_validity=i == 0,
+                pyramid=self.frame_pyramid(frame),
+            )
+            if not analysis.valid:
+                # Not classified again on every frame meanwhile, but once the
+                # view changed (e.g. the hand leaving the board) or after a while.
+                self.board_gate.reject(self.frame_pyramid(frame), frame.timestamp)
+                return
+
+            probs = analysis.probs
+            self._vision_stats['classified_cells'] += nb_cells
+            self._vision_stats['skipped_cells'] += 9 - nb_cells
+
+            board = self.board_fusion.update(probs)
+            if board is not None:
+                break
+            frame = self.wait_for_frame(since=frame.timestamp)
+        else:
+            logger.warning('Board classification not confident', extra={
+                'posterior': self.board_fusion.posterior,
+                'frames': self.board_fusion.nb_frames,
+            })
+            self.board_gate.reject(self.frame_pyramid(frame), frame.timestamp)
             return
 
-        tic = time.time()
-        
-        success, img = self.reachy.head.right_camera.read()
-        board, _ = get_board_configuration(img)
+        self.board_gate.accept(self.frame_pyramid(frame))
 
-        # TEMP
         logger.info(
             'Board analyzed',
             extra={
                 'board': board,
+                'frames': self.board_fusion.nb_frames,
                 'img_path': path,
+                'game': self.nb_games,
+                'turn': self.turn,
             },
         )
 
+        self.last_analyzed_board = BoardState.from_array(board)
+
+        if known is not None and not check_occupied and self.last_analyzed_board == known:
+            # Something changed but none of the empty cells: pieces must have
+            # been moved or removed (e.g. the board cleaned up before being seen).
+            return self.classify_frame(frame, check_occupied=True)
+
+        if known is not None:
+            # The pieces will be removed once the game is over.
+            final = rules.is_final(self.last_analyzed_board)
+            self.known_board = None if final else self.last_analyzed_board
+
+        return self.last_analyzed_board
+
+    @property
+    def turn(self):
+        # Number of pieces played in the current game (None outside of a game).
+        if self.known_board is None:
+            return None
+        return self.known_board.nb_cubes + self.known_board.nb_cylinders
+
+    def frame_pyramid(self, frame):
+        # The board region pyramid is built once per frame and shared by
+        # the change detection, the calibration and the classifiers.
+        if self._pyramid is None or self._pyramid[0] != frame.index:
+            self._pyramid = (frame.index, board_pyramid(frame.img))
+        return self._pyramid[1]
+
+    def look_at_board(self):
+        for disk in self.reachy.head.neck.disks:
+            disk.compliant = False
+
+        self.clock.sleep(0.1, 'settle')
+
+        self.reachy.head.look_at(0.5, 0, z=-0.6, duration=1, wait=True)
+        self.clock.sleep(0.2, 'settle')
+
+        self.head_on_board = True
+        self.board_gate.reset_motion()
+        self._vision_stats['head_motions'] += 1
+
+    def look_straight(self):
         self.reachy.head.compliant = False
-        time.sleep(0.1)
+        self.clock.sleep(0.1, 'settle')
         self.reachy.head.look_at(1, 0, 0, duration=0.75, wait=True)
 
-        return board.flatten()
+        self.head_on_board = False
+        self._vision_stats['head_motions'] += 1
+
+    @property
+    def vision_stats(self):
+        stats = dict(self._vision_stats)
+        stats.update(self.board_gate.stats)
+        return stats
+
+    def reset_vision_stats(self):
+        self._vision_stats = {
+            'head_motions': 0,
+            'saved_head_motions': 0,
+            'classified_cells': 0,
+            'skipped_cells': 0,
+            'verified_moves': 0,
+            'human_played_during_check': 0,
+            'cleared_during_check': 0,
+            'unseen_checks': 0,
+            'unconfirmed_moves': 0,
+        }
+        self._nb_board_classifications = 0
+        self.board_gate.reset_stats()
 
     def incoherent_board_detected(self, board):
-        nb_cubes = len(np.where(board == piece2id['cube'])[0])
-        nb_cylinders = len(np.where(board == piece2id['cylinder'])[0])
-
-        if abs(nb_cubes - nb_cylinders) <= 1:
+        if board.is_coherent():
             return False
 
         logger.warning('Incoherent board detected', extra={
@@ -163,21 +369,7 @@ class TictactoePlayground(object):
 
     def cheating_detected(self, board, last_board, reachy_turn):
         # last is just after the robot played
-        delta = board - last_board
-
-        # Nothing changed
-        if np.all(delta == 0):
-            return False
-
-        # A single cube was added
-        if len(np.where(delta == piece2id['cube'])[0]) == 1:
-            return False
-
-        # A single cylinder was added
-        if len(np.where(delta == piece2id['cylinder'])[0]) == 1:
-            # If the human added a cylinder
-            if not reachy_turn:
-                return True
+        if board.is_valid_transition(last_board, reachy_turn):
             return False
 
         logger.warning('Cheating detected', extra={
@@ -188,47 +380,37 @@ class TictactoePlayground(object):
         return True
 
     def shuffle_board(self):
+        self.head_on_board = False
+        self.board_gate.reset()
+        self.known_board = None
+
         def ears_no():
             d = 3
             f = 2
-            time.sleep(2.5)
+            self.clock.sleep(2.5, None)
             t = np.linspace(0, d, d * 100)
             p = 25 + 25 * np.sin(2 * np.pi * f * t)
             for pp in p:
                 self.reachy.head.left_antenna.goal_position = pp
-                time.sleep(0.01)
+                self.clock.sleep(0.01, None)
 
         t = Thread(target=ears_no)
-        t.start()
+        self.clock.start(t)
 
         self.goto_base_position()
         self.reachy.head.look_at(0.5, 0, -0.4, duration=1, wait=False)
-        TrajectoryPlayer(self.reachy, moves['shuffle-board']).play(wait=True)
+        self.play_trajectory(moves['shuffle-board'])
         self.goto_rest_position()
         self.reachy.head.look_at(1, 0, 0, duration=1, wait=True)
-        t.join()
+        self.clock.join(t)
 
     def choose_next_action(self, board):
-        actions = value_actions(board)
-
-        # If empty board starts with a random actions for diversity
-        if np.all(board == 0):
-            while True:
-                i = np.random.randint(0, 9)
-                a, _ = actions[i]
-                if a != 8:
-                    break
+        actions = value_actions(board, next_player=piece2id['cylinder'])
 
-        elif np.sum(board) == piece2id['cube']:
-            a, _ = actions[0]
-            if a == 8:
-                i = 1
-            else:
-                i = 0
-        else:
-            i = 0
-
-        best_action, value = actions[i]
+        # Pick randomly among the equally optimal actions for diversity
+        best_value = actions[0][1]
+        optimal = [a for a, v in actions if v == best_value]
+        best_action, value = np.random.choice(optimal), best_value
 
         logger.info(
             'Selecting Reachy next action',
@@ -242,17 +424,19 @@ class TictactoePlayground(object):
         return best_action, value
 
     def play(self, action, actual_board):
-        board = actual_board.copy()
+        board = actual_board.place(action, piece2id['cylinder'])
+        if self.known_board is not None:
+            # The game may be over: the pieces will then be removed.
+            self.known_board = None if rules.is_final(board) else board
 
         self.play_pawn(
             grab_index=self.pawn_played + 1,
             box_index=action + 1,
+            expected_board=board,
         )
 
         self.pawn_played += 1
 
-        board[action] = piece2id['cylinder']
-
         logger.info(
             'Reachy playing pawn',
             extra={
@@ -265,158 +449,173 @@ class TictactoePlayground(object):
 
         return board
 
-    def play_pawn(self, grab_index, box_index):
+    def play_pawn(self, grab_index, box_index, expected_board=None):
+        self.head_on_board = False
+
         self.reachy.head.look_at(
             0.3, -0.3, -0.3,
             duration=0.85,
             wait=False,
         )
 
-        # Goto base position
-        self.goto_base_position()
-
-        if grab_index >= 4:
-            self.goto_position(
-                moves['grab_3'],
-                duration=1,
-                wait=True,
-            )
-
-        # Grab the pawn at grab_index
-        self.goto_position(
-            moves[f'grab_{grab_index}'],
-            duration=1,
-            wait=True,
+        # The arm only stops to grab and release the pawn (see trajectory.py),
+        # the trajectories are precompiled for the moves from the rest position.
+        to_pawn, to_box, to_rest = play_pawn_trajectories(
+            grab_index, box_index,
+            start={m.name: m.goal_position for m in self.reachy.right_arm.motors},
         )
-        self.reachy.right_arm.hand.close()
+
+        with self.turn_timer.phase('grab'):
+            self.stiffen_arm()
+            self.play_trajectory(to_pawn)
+            self.reachy.right_arm.hand.close()
 
         self.reachy.head.left_antenna.goto(45, 1, interpolation_mode='minjerk')
         self.reachy.head.right_antenna.goto(-45, 1, interpolation_mode='minjerk')
-
-        if grab_index >= 4:
-            self.reachy.goto({
-                'right_arm.shoulder_pitch': self.reachy.right_arm.shoulder_pitch.goal_position + 10,
-                'right_arm.elbow_pitch': self.reachy.right_arm.elbow_pitch.goal_position - 30,
-            }, duration=1,
-               wait=True,
-               interpolation_mode='minjerk',
-               starting_point='goal_position',
-            )
-
-        # Lift it
-        self.goto_position(
-            moves['lift'],
-            duration=1,
-            wait=True,
-        )
-
         self.reachy.head.look_at(0.5, 0, -0.35, duration=0.5, wait=False)
-        time.sleep(0.1)
-
-        # Put it in box_index
-        put = moves[f'put_{box_index}_smooth_10_kp']
-        j = {
-            m: j
-            for j, m in zip(
-                np.array(list(put.values()))[:, 0],
-                list(put.keys())
-            )
-        }
-        self.goto_position(j, duration=0.5, wait=True)
-        TrajectoryPlayer(self.reachy, put).play(wait=True)
 
-        self.reachy.right_arm.hand.open()
-
-        # Go back to rest position
-        self.goto_position(
-            moves[f'back_{box_index}_upright'],
-            duration=1,
-            wait=True,
-        )
+        with self.turn_timer.phase('place'):
+            self.play_trajectory(to_box)
+            self.reachy.right_arm.hand.open()
 
         self.reachy.head.left_antenna.goto(0, 0.2, interpolation_mode='minjerk')
         self.reachy.head.right_antenna.goto(0, 0.2, interpolation_mode='minjerk')
 
-        self.reachy.head.look_at(1, 0, 0, duration=1, wait=False)
+        # The board changed under the camera's reference, classify it again next time.
+        self.board_gate.reset()
 
-        if box_index in (8, 9):
-            self.goto_position(
-                moves['back_to_back'],
-                duration=1,
-                wait=True,
-            )
+        def go_back():
+            with self.turn_timer.phase('return'):
+                self.play_trajectory(to_rest)
+                self.relax_arm()
 
-        self.goto_position(
-            moves['back_rest'],
-            duration=2,
-            wait=True,
-        )
+        def check():
+            with self.turn_timer.phase('verify'):
+                self.verify_move(expected_board)
 
-        self.goto_rest_position()
+        if expected_board is None:
+            self.reachy.head.look_at(1, 0, 0, duration=1, wait=False)
+            go_back()
+        elif self.pipelined_turns:
+            self.clock.run_concurrently(go_back, check)
+        else:
+            self.reachy.head.look_at(1, 0, 0, duration=1, wait=False)
+            go_back()
+            check()
+
+    def verify_move(self, expected_board):
+        # Aims at the board and classifies it once still (e.g. the arm left the
+        # camera's field of view). The frame becomes the change detection's reference.
+        self.look_at_board()
+
+        frame = self.wait_for_frame(since=self.clock.time())
+        self.board_gate.update(self.frame_pyramid(frame), frame.timestamp)
+        deadline = frame.timestamp + self.verify_timeout
+        while not self.board_gate.is_still(frame.timestamp) and frame.timestamp < deadline:
+            frame = self.wait_for_frame(since=frame.timestamp)
+            self.board_gate.update(self.frame_pyramid(frame), frame.timestamp)
+
+        self.board_gate.count(classified=True)
+        board = self.classify_frame(frame)
+
+        while board is None and frame.timestamp < deadline:
+            # Not seen (e.g. the human's hand over the board): classified
+            # again once the view has changed (or after a while), until the deadline.
+            while frame.timestamp < deadline:
+                frame = self.wait_for_frame(since=frame.timestamp)
+                if self.board_gate.update(self.frame_pyramid(frame), frame.timestamp) == CHANGED:
+                    self.board_gate.count(classified=True)
+                    board = self.classify_frame(frame)
+                    break
 
-    def is_final(self, board):
-        winner = self.get_winner(board)
-        if winner in ('robot', 'human'):
+        if board == expected_board:
+            self._vision_stats['verified_moves'] += 1
             return True
-        else:
-            return 0 not in board
 
-    def has_human_played(self, current_board, last_board):
-        cube = piece2id['cube']
+        if board is None:
+            # The gate keeps the last (unseen) view: the next watch classifies
+            # the board once it has changed, or after a while.
+            logger.info('Robot move not checked, board not seen', extra={
+                'expected_board': expected_board,
+            })
+            self._vision_stats['unseen_checks'] += 1
+            return False
 
-        return (
-            np.any(current_board != last_board) and
-            np.sum(current_board == cube) > np.sum(last_board == cube)
-        )
+        # The board is handed to the next watch instead of being lost.
+        self._seen_board = board
 
-    def get_winner(self, board):
-        win_configurations = (
-            (0, 1, 2),
-            (3, 4, 5),
-            (6, 7, 8),
+        added_cubes, added_cylinders, removed = board.diff(expected_board)
+        if board.one_cube_added(expected_board) and not (added_cylinders or removed):
+            # The human already played on top of the robot's move.
+            logger.info('Human played during the robot move check', extra={
+                'expected_board': expected_board,
+                'board': board,
+            })
+            self._vision_stats['human_played_during_check'] += 1
+            return True
 
-            (0, 3, 6),
-            (1, 4, 7),
-            (2, 5, 8),
+        if board.is_empty() and rules.is_final(expected_board):
+            # The game was over and the board has already been cleaned up.
+            logger.info('Board cleaned up during the robot move check', extra={
+                'expected_board': expected_board,
+            })
+            self._vision_stats['cleared_during_check'] += 1
+            return False
 
-            (0, 4, 8),
-            (2, 4, 6),
-        )
+        logger.warning('Robot move not confirmed', extra={
+            'expected_board': expected_board,
+            'board': board,
+        })
+        self._vision_stats['unconfirmed_moves'] += 1
+        return False
+
+    def start_turn(self):
+        self.turn_timer.start()
 
-        for c in win_configurations:
-            trio = set(board[i] for i in c)
-            for id in id2piece.keys():
-                if trio == set([id]):
-                    winner = piece2player[id2piece[id]]
-                    if winner in ('robot', 'human'):
-                        return winner
+    def end_turn(self):
+        profile = self.turn_timer.summary()
+        self.turn_profiles.append(profile)
+        logger.info('Robot turn', extra=profile)
+
+    def is_final(self, board):
+        return rules.is_final(board)
 
-        return 'nobody'
+    def has_human_played(self, current_board, last_board):
+        return current_board.nb_cubes > last_board.nb_cubes
+
+    def get_winner(self, board):
+        return rules.get_winner(board)
 
     def run_celebration(self):
         logger.info('Reachy is playing its win behavior')
-        behavior.happy(self.reachy)
+        self.head_on_board = False
+        behavior.happy(self.reachy, self.clock)
 
     def run_draw_behavior(self):
         logger.info('Reachy is playing its draw behavior')
-        behavior.surprise(self.reachy)
+        self.head_on_board = False
+        behavior.surprise(self.reachy, self.clock)
 
     def run_defeat_behavior(self):
         logger.info('Reachy is playing its defeat behavior')
+        self.head_on_board = False
         behavior.sad(self.reachy)
 
     def run_my_turn(self):
         self.goto_base_position()
-        TrajectoryPlayer(self.reachy, moves['my-turn']).play(wait=True)
+        self.play_trajectory(moves['my-turn'])
         self.goto_rest_position()
 
     def run_your_turn(self):
         self.goto_base_position()
-        TrajectoryPlayer(self.reachy, moves['your-turn']).play(wait=True)
+        self.play_trajectory(moves['your-turn'])
         self.goto_rest_position()
 
     # Robot lower-level control functions
 
+    def play_trajectory(self, trajectory):
+        self.trajectory_player(self.reachy, trajectory).play(wait=True)
+
     def goto_position(self, goal_positions, duration, wait):
         self.reachy.goto(
             goal_positions=goal_positions,
@@ -427,46 +626,64 @@ class TictactoePlayground(object):
         )
 
     def goto_base_position(self, duration=2.0):
-        for m in self.reachy.right_arm.motors:
-            m.compliant = False
-
-        time.sleep(0.1)
-
-        self.reachy.right_arm.shoulder_pitch.torque_limit = 75
-        self.reachy.right_arm.elbow_pitch.torque_limit = 75
-        time.sleep(0.1)
-
+        self.stiffen_arm()
         self.goto_position(base_pos, duration, wait=True)
 
     def goto_rest_position(self, duration=2.0):
         # FIXME: Why is it needed?
-        time.sleep(0.1)
+        self.clock.sleep(0.1, 'settle')
 
         self.goto_base_position(0.6 * duration)
-        time.sleep(0.1)
+        self.clock.sleep(0.1, 'settle')
 
         self.goto_position(rest_pos, 0.4 * duration, wait=True)
-        time.sleep(0.1)
+        self.clock.sleep(0.1, 'settle')
+
+        self.relax_arm()
+
+    def stiffen_arm(self):
+        for m in self.reachy.right_arm.motors:
+            m.compliant = False
+
+        self.clock.sleep(0.1, 'settle')
+
+        self.reachy.right_arm.shoulder_pitch.torque_limit = 75
+        self.reachy.right_arm.elbow_pitch.torque_limit = 75
+        self.clock.sleep(0.1, 'settle')
 
+    def relax_arm(self):
         self.reachy.right_arm.shoulder_pitch.torque_limit = 0
         self.reachy.right_arm.elbow_pitch.torque_limit = 0
 
-        time.sleep(0.25)
+        self.clock.sleep(0.25, 'settle')
 
         for m in self.reachy.right_arm.motors:
             if m.name != 'right_arm.shoulder_pitch':
                 m.compliant = True
 
-        time.sleep(0.25)
+        self.clock.sleep(0.25, 'settle')
 
-    def wait_for_img(self):
-        start = time.time()
-        while time.time() - start <= 30:
-            success, img = self.reachy.head.right_camera.read()
-            if img != []:
-                return
-        logger.warning('No image received for 30 sec, going to reboot.')
-        os.system('sudo reboot')
+    def wait_for_frame(self, since):
+        # Never returns without a frame: the robot is rebooted after 30s
+        # without any, and the wait goes on until the reboot (or the camera
+        # is back).
+        rebooting = False
+        while True:
+            frame = self.frame_grabber.wait_for_frame_after(since, timeout=30)
+            if frame is not None:
+                return frame
+
+            if rebooting:
+                logger.warning('Still no image received, waiting for the reboot.', extra={
+                    'camera': self.frame_grabber.stats,
+                })
+                continue
+
+            logger.warning('No image received for 30 sec, going to reboot.', extra={
+                'camera': self.frame_grabber.stats,
+            })
+            os.system('sudo reboot')
+            rebooting = True
 
     def need_cooldown(self):
         motor_temperature = np.array([
@@ -489,6 +706,8 @@ class TictactoePlayground(object):
         return np.any(motor_temperature > 50) or np.any(orbita_temperature > 45)
 
     def wait_for_cooldown(self):
+        self.head_on_board = False
+
         self.goto_rest_position()
         self.reachy.head.look_at(0.5, 0, -0.65, duration=1.25, wait=True)
         self.reachy.head.compliant = True
@@ -514,9 +733,11 @@ class TictactoePlayground(object):
             if np.all(motor_temperature < 45) and np.all(orbita_temperature < 40):
                 break
 
-            time.sleep(30)
+            self.clock.sleep(30, 'cooldown')
 
     def enter_sleep_mode(self):
+        self.head_on_board = False
+
         self.reachy.head.look_at(0.5, 0, -0.65, duration=1.25, wait=True)
         self.reachy.head.compliant = True
 
@@ -529,18 +750,20 @@ class TictactoePlayground(object):
             offset = 30
 
             while self._idle_running.is_set():
-                p = offset + amp * np.sin(2 * np.pi * f * time.time())
+                p = offset + amp * np.sin(2 * np.pi * f * self.clock.time())
                 self.reachy.head.left_antenna.goal_position = p
                 self.reachy.head.right_antenna.goal_position = -p
-                time.sleep(0.01)
+                self.clock.sleep(0.01, None)
 
         self._idle_t = Thread(target=_idle)
-        self._idle_t.start()
+        self.clock.start(self._idle_t)
 
     def leave_sleep_mode(self):
+        self.head_on_board = False
+
         self.reachy.head.compliant = False
-        time.sleep(0.1)
+        self.clock.sleep(0.1, 'settle')
         self.reachy.head.look_at(1, 0, 0, duration=1, wait=True)
 
         self._idle_running.clear()
-        self._idle_t.join()
+        self.clock.join(self._idle_t)
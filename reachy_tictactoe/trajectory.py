@@ -0,0 +1,124 @@
+import numpy as np
+
+from .moves import moves, base_pos, rest_pos
+
+
+# To be increased whenever the composed trajectories change (e.g. the
+# blending or the play pawn durations): the compiled ones are then stale.
+COMPOSER_VERSION = 2
+
+default_blend = 0.4
+
+
+def minjerk(tau):
+    # Normalized minimum jerk profile: from 0 to 1 as tau goes from 0 to 1.
+    tau = np.clip(tau, 0, 1)
+    return tau ** 3 * (10 - 15 * tau + 6 * tau ** 2)
+
+
+class TrajectoryComposer(object):
+    # Joins goto positions and recorded trajectories into a single trajectory,
+    # sampled at freq as played by the TrajectoryPlayer.
+    #
+    # The segments are blended by superposition of their displacements: each one
+    # starts blend (fraction of the shorter of the two) before the previous one
+    # ends. The arm goes by the intermediate positions without stopping there,
+    # the velocity and acceleration stay continuous, and the final position is
+    # reached exactly.
+    def __init__(self, start, motors=None, freq=100, blend=default_blend):
+        self.motors = list(motors if motors is not None else start)
+        self.freq = freq
+        self.blend = blend
+
+        self._start = self._vector(start, np.zeros(len(self.motors)))
+        self._position = self._start
+        self._segments = []
+
+    def goto(self, goal_positions, duration):
+        target = self._vector(goal_positions, self._position)
+        nb_samples = max(int(round(duration * self.freq)), 1)
+        displacement = (target - self._position) * minjerk(np.arange(nb_samples + 1) / nb_samples)[:, np.newaxis]
+
+        self._segments.append(displacement)
+        self._position = target
+
+    def play(self, trajectory):
+        # The recorded trajectory is played relative to where the previous
+        # segments end (e.g. its first position, reached with a goto).
+        nb_samples = len(np.ravel(next(iter(trajectory.values()))))
+        samples = np.tile(self._position, (nb_samples, 1))
+        for i, motor in enumerate(self.motors):
+            if motor in trajectory:
+                samples[:, i] = np.ravel(trajectory[motor])
+
+        self._segments.append(samples - samples[0])
+        self._position = self._position + samples[-1] - samples[0]
+
+    @property
+    def nominal_duration(self):
+        # Duration of the segments played one after the other, stopping in between.
+        return sum(len(d) - 1 for d in self._segments) / self.freq
+
+    def compose(self):
+        starts = [0]
+        for before, after in zip(self._segments, self._segments[1:]):
+            overlap = int(self.blend * (min(len(before), len(after)) - 1))
+            starts.append(starts[-1] + len(before) - 1 - overlap)
+
+        nb_samples = (starts[-1] + len(self._segments[-1])) if self._segments else 1
+        trajectory = np.tile(self._start, (nb_samples, 1))
+
+        for start, displacement in zip(starts, self._segments):
+            end = start + len(displacement)
+            trajectory[start:end] += displacement
+            # Once done, the segment's displacement still holds.
+            trajectory[end:] += displacement[-1]
+
+        return {motor: trajectory[:, i] for i, motor in enumerate(self.motors)}
+
+    def _vector(self, positions, default):
+        return np.array([
+            float(np.ravel(positions[m])[0]) if m in positions else default[i]
+            for i, m in enumerate(self.motors)
+        ])
+
+
+def compose_play_pawn(grab_index, box_index, start=rest_pos, freq=100):
+    # The arm moves of TictactoePlayground.play_pawn as three trajectories,
+    # cut by the gripper: from the start position to the pawn, from the pawn
+    # to the box, and from the box back to the rest position. Once closed on
+    # the pawn, the gripper is only moved by the hand (close and open).
+    gripper = 'right_arm.hand.gripper'
+
+    to_pawn = TrajectoryComposer(dict(base_pos, **start), freq=freq)
+    to_pawn.goto(base_pos, 2.0)
+    if grab_index >= 4:
+        to_pawn.goto(moves['grab_3'], 1.0)
+    to_pawn.goto(moves[f'grab_{grab_index}'], 1.0)
+    to_pawn = to_pawn.compose()
+
+    # The gripper is left alone while it holds the pawn, and once it released it.
+    grab = {m: traj[-1] for m, traj in to_pawn.items()}
+    arm = [m for m in grab if m != gripper]
+    to_box = TrajectoryComposer(grab, motors=arm, freq=freq)
+    if grab_index >= 4:
+        to_box.goto({
+            'right_arm.shoulder_pitch': grab['right_arm.shoulder_pitch'] + 10,
+            'right_arm.elbow_pitch': grab['right_arm.elbow_pitch'] - 30,
+        }, 1.0)
+    to_box.goto(moves['lift'], 1.0)
+    put = moves[f'put_{box_index}_smooth_10_kp']
+    to_box.goto({m: traj[0] for m, traj in put.items()}, 0.5)
+    to_box.play(put)
+    to_box = to_box.compose()
+
+    to_rest = TrajectoryComposer({m: traj[-1] for m, traj in to_box.items()}, motors=arm, freq=freq)
+    to_rest.goto(moves[f'back_{box_index}_upright'], 1.0)
+    if box_index in (8, 9):
+        to_rest.goto(moves['back_to_back'], 1.0)
+    to_rest.goto(moves['back_rest'], 2.0)
+    to_rest.goto(base_pos, 1.2)
+    to_rest.goto(rest_pos, 0.8)
+    to_rest = to_rest.compose()
+
+    return to_pawn, to_box, to_rest
@@ -1,29 +1,27 @@
+import os
 import numpy as np
-import cv2 as cv
 import logging
-import os
-
-from PIL import Image
-
-from edgetpu.utils import dataset_utils
-from edgetpu.classification.engine import ClassificationEngine
+import time
 
+from collections import namedtuple
 
+from . import resources
 from .utils import piece2id
-from .detect_board import get_board_cases
+from .calibration import BoardCalibration, default_path as default_calibration_path
+from .inference import Classifier
+from .preprocessing import CropPreprocessor, RoiPyramid
 
 
 logger = logging.getLogger('reachy.tictactoe')
 
 
-dir_path = os.path.dirname(os.path.realpath(__file__))
-model_path = os.path.join(dir_path, 'models')
+boxes_classifier = resources.register('boxes_classifier', lambda: Classifier('ttt-boxes'))
+valid_classifier = resources.register('valid_classifier', lambda: Classifier('ttt-valid-board'))
 
-boxes_classifier = ClassificationEngine(os.path.join(model_path, 'ttt-boxes.tflite'))
-boxes_labels = dataset_utils.read_label_file(os.path.join(model_path, 'ttt-boxes.txt'))
 
-valid_classifier = ClassificationEngine(os.path.join(model_path, 'ttt-valid-board.tflite'))
-valid_labels = dataset_utils.read_label_file(os.path.join(model_path, 'ttt-valid-board.txt'))
+def use_backend(backend, num_threads=None):
+    boxes_classifier.set_loader(lambda: Classifier('ttt-boxes', backend, num_threads))
+    valid_classifier.set_loader(lambda: Classifier('ttt-valid-board', backend, num_threads))
 
 
 board_cases = np.array((
@@ -45,58 +43,256 @@ board_rect = np.array((
     250, 700, 350, 1000,
 ))
 
+validity_threshold = 0.65
+
+# Cells classified with a lower score are taken as empty.
+piece_score_threshold = 0.9
+
+# Calibrated cells further than this (in pixels) from the reference ones are discarded.
+board_detection_tolerance = 40
+
+# All the cells, wherever the calibration puts them (used to detect changes on the board).
+board_cells_rect = np.array((
+    max(board_cases[..., 0].min() - board_detection_tolerance, 0),
+    board_cases[..., 1].max() + board_detection_tolerance,
+    max(board_cases[..., 2].min() - board_detection_tolerance, 0),
+    board_cases[..., 3].max() + board_detection_tolerance,
+))
+
+# Region searched by the board detection: the whole grid, as long as it is
+# calibrated within the tolerance of the reference cells.
+detection_roi = board_cells_rect
+
+# Region covered by the frames pyramid: the board validity rect, the
+# cells rect and the region searched by the board detection.
+_rects = np.array((board_rect, board_cells_rect, detection_roi))
+pyramid_roi = np.array((
+    _rects[:, 0].min(), _rects[:, 1].max(),
+    _rects[:, 2].min(), _rects[:, 3].max(),
+))
+pyramid_levels = 4
+
+# Pyramid level the validity classifier runs on (see the benchmark's pyramid sweep).
+# Full resolution by default: a downscaled level is only to be used once the
+# sweep on recorded frames has shown it keeps the same predictions.
+validity_level = int(os.getenv('REACHY_TICTACTOE_VALIDITY_LEVEL', 0))
+
+
+def load_calibration(path=default_calibration_path):
+    calib = BoardCalibration(
+        path=path,
+        reference_cases=board_cases,
+        tolerance=board_detection_tolerance,
+        roi=detection_roi,
+    )
+    calib.load()
+    return calib
+
+
+calibration = resources.register('board_calibration', load_calibration)
 
-def get_board_configuration(img):
-    board = np.zeros((3, 3), dtype=np.uint8)
 
-    # try:
-    #     custom_board_cases = get_board_cases(img)
-    # except Exception as e:
-    #     logger.warning('Board detection failed', extra={'error': e})
-    #     custom_board_cases = board_cases
-    custom_board_cases = board_cases
+def use_calibration(path):
+    calibration.set_loader(lambda: load_calibration(path))
+
+
+def board_pyramid(img):
+    return RoiPyramid(img, pyramid_roi, pyramid_levels)
+
+
+def board_view(img, pyramid=None):
+    # Returns the image to crop the cells from and the cells rects: the board
+    # warped on a fixed grid once calibrated, the reference cells otherwise.
+    calib = calibration.get()
+
+    if calib.is_calibrated:
+        warped = calib.warp(img)
+        calib.track(img, warped, pyramid)
+        return warped, calib.cell_rects
+
+    calib.track(img, pyramid=pyramid)
+    return img, board_cases.reshape(-1, 4)
+
+
+def validity_input(img, pyramid=None, level=None):
+    # The board region at the validity level of the frame's pyramid, as an
+    # image and the rect to crop from it.
+    if pyramid is None:
+        pyramid = board_pyramid(img)
+    if level is None:
+        level = validity_level
+
+    roi = pyramid.crop(board_rect, level)
+    h, w = roi.shape[:2]
+    return roi, [(0, w, 0, h)]
+
+
+def cells_to_classify(known=None, check_occupied=False):
+    # Pieces are never removed during a game, so given the last confirmed
+    # board only its empty cells need to be classified again.
+    # The mask is in the cells rects order (i.e. not inverted).
+    if known is None or check_occupied:
+        return np.ones(9, dtype=bool)
+
+    return (np.asarray(known).ravel() == piece2id['none'])[::-1]
+
+
+def get_board_configuration(img, known=None, check_occupied=False):
     sanity_check = True
 
-    for row in range(3):
-        for col in range(3):
-            lx, rx, ly, ry = custom_board_cases[row, col]
-            piece, score = identify_box(img[ly:ry, lx:rx])
-            #if score < 0.9:
-            #    sanity_check = False
-            #    return [], sanity_check
-            # We invert the board to present it from the Human point of view
-            if score < 0.9:
-                piece = 0
-            board[2 - row, 2 - col] = piece
+    view, rects = board_view(img)
+    mask = cells_to_classify(known, check_occupied)
+
+    pieces = np.zeros(9, dtype=np.int64)
+    scores = np.ones(9)
+    if known is not None:
+        pieces[:] = np.asarray(known).ravel()[::-1]
+    if np.any(mask):
+        pieces[mask], scores[mask] = identify_boxes(view, rects[mask])
+
+    # if np.any(scores < 0.9):
+    #     sanity_check = False
+    #     return [], sanity_check
+    pieces[scores < piece_score_threshold] = 0
+
+    # We invert the board to present it from the Human point of view
+    board = pieces.reshape(3, 3)[::-1, ::-1].astype(np.uint8)
+
     return board, sanity_check
 
 
-def identify_box(box_img):
+def cells_probabilities(classifier, batch, mask, known=None):
+    # The cells that are not classified keep their known piece for sure.
+    probs = np.zeros((9, len(classifier.labels)))
+    if known is not None:
+        probs[np.arange(9), np.asarray(known).ravel()[::-1]] = 1
+    if np.any(mask):
+        probs[mask] = predict_batch(classifier, batch)
+
+    # We invert the board to present it from the Human point of view
+    return probs[::-1]
+
+
+FrameAnalysis = namedtuple('FrameAnalysis', [
+    'valid', 'validity_score', 'board', 'probs', 'scores', 'timings',
+])
+
+
+def analyze_frame(img, known=None, check_occupied=False, check_validity=True, pyramid=None):
+    # Validity check and cells classification of a single frame.
+    # board, probs and scores are None when the board is not valid.
+    timings = {}
+    tic = time.time()
+
+    valid_clf = valid_classifier.get()
+    boxes_clf = boxes_classifier.get()
+
+    if pyramid is None:
+        pyramid = board_pyramid(img)
+
+    view, rects = board_view(img, pyramid)
+    mask = cells_to_classify(known, check_occupied)
+    cells = rects[mask]
+    timings['view'] = time.time() - tic
+
+    t = time.time()
+    if not check_validity:
+        valid_batch, cells_batch = None, preprocess(boxes_clf, view, cells)
+    elif valid_clf.input_size == boxes_clf.input_size:
+        # Both models take the same input: the board and cells crops
+        # share a single buffer and color conversion.
+        preprocessor = get_preprocessor('frame', boxes_clf.input_size, 1 + len(rects))
+        batch = preprocessor.crop_all([validity_input(img, pyramid), (view, cells)])
+        valid_batch, cells_batch = batch[:1], batch[1:]
+    else:
+        valid_batch = preprocess(valid_clf, *validity_input(img, pyramid))
+        cells_batch = preprocess(boxes_clf, view, cells)
+    timings['preprocess'] = time.time() - t
+
+    valid, validity_score = True, None
+    if check_validity:
+        t = time.time()
+        labels, scores = classify_batch(valid_clf, valid_batch)
+        validity_score = float(scores[0])
+        valid = valid_clf.labels[labels[0]] == 'valid' and validity_score > validity_threshold
+        timings['validity'] = time.time() - t
+
+    board = probs = scores = None
+    if valid:
+        t = time.time()
+        probs = cells_probabilities(boxes_clf, cells_batch, mask, known)
+        scores = probs.max(axis=1).reshape(3, 3)
+        # Same rule as get_board_configuration: unsure cells are empty.
+        board = probs.argmax(axis=1).reshape(3, 3).astype(np.uint8)
+        board[scores < piece_score_threshold] = 0
+        timings['cells'] = time.time() - t
+
+    timings['total'] = time.time() - tic
+
+    logger.info('Frame analyzed', extra={
+        'valid': valid,
+        'validity_score': validity_score,
+        'nb_cells': len(cells),
+        'timings': timings,
+    })
 
-    res = boxes_classifier.classify_with_image(img_as_pil(box_img), top_k=1)
-    assert res
+    return FrameAnalysis(valid, validity_score, board, probs, scores, timings)
 
-    label, score = res[0]
 
-    return label, score
+def identify_boxes(img, rects):
+    classifier = boxes_classifier.get()
+    return classify_batch(classifier, preprocess(classifier, img, rects))
 
 
-def is_board_valid(img):
-    lx, rx, ly, ry = board_rect
-    board_img = img[ly:ry, lx:rx]
-    res = valid_classifier.classify_with_image(img_as_pil(board_img), top_k=1)
-    assert res
+def is_board_valid(img, pyramid=None):
+    classifier = valid_classifier.get()
+    labels, scores = classify_batch(classifier, preprocess(classifier, *validity_input(img, pyramid)))
 
-    label_index, score = res[0]
-    label = valid_labels[label_index]
+    label, score = classifier.labels[labels[0]], scores[0]
 
     logger.info('Board validity check', extra={
         'label': label,
         'score': score,
     })
 
-    return label == 'valid' and score > 0.65
+    return label == 'valid' and score > validity_threshold
+
+
+_preprocessors = {}
+
+
+def get_preprocessor(key, input_size, max_crops):
+    preprocessor = _preprocessors.get(key)
+
+    if preprocessor is None or preprocessor.input_size != input_size:
+        preprocessor = CropPreprocessor(input_size, max_crops=max_crops)
+        _preprocessors[key] = preprocessor
+
+    return preprocessor
+
+
+def preprocess(classifier, img, rects):
+    preprocessor = get_preprocessor(classifier.name, classifier.input_size, len(rects))
+    return preprocessor(img, rects)
+
+
+def predict_batch(classifier, batch):
+    tic = time.time()
+
+    probs = classifier.predict(batch)
+
+    logger.info('Batch classified', extra={
+        'model': classifier.name,
+        'batch_size': len(batch),
+        'latency': time.time() - tic,
+    })
+
+    return probs
+
 
+def classify_batch(classifier, batch):
+    probs = predict_batch(classifier, batch)
+    labels = probs.argmax(axis=1)
+    scores = probs[np.arange(len(probs)), labels]
 
-def img_as_pil(img):
-    return Image.fromarray(cv.cvtColor(img.copy(), cv.COLOR_BGR2RGB))
+    return labels, scores
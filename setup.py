@@ -18,6 +18,9 @@ setup(
     author='Pollen-Robotics',
     author_email='contact@pollen-robotics.com',
     packages=find_packages(exclude=['tests']),
+    package_data={
+        'reachy_tictactoe': ['ttt-solver-v*.npy'],
+    },
     python_requires='>=3.5',
     install_requires=[
         'numpy',
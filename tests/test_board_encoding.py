@@ -0,0 +1,24 @@
+import numpy as np
+
+from reachy_tictactoe.board_encoding import NB_BOARDS, canonical_code, canonicalize, decode, encode
+
+
+codes = np.arange(NB_BOARDS)
+
+
+def test_encode_decode_round_trip():
+    boards = decode(codes)
+
+    assert boards.shape == (NB_BOARDS, 9)
+    assert np.array_equal(encode(boards), codes)
+    assert len(np.unique(boards, axis=0)) == NB_BOARDS
+
+
+def test_canonical_code():
+    boards = decode(codes)
+    canonical, _ = canonicalize(boards)
+
+    for board, code in zip(boards[::7], canonical[::7]):
+        assert canonical_code(tuple(board)) == code
+    assert np.all(canonical <= codes)
+
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from reachy_tictactoe import rules
+from reachy_tictactoe.benchmark import set_get_winner, set_is_final
+from reachy_tictactoe.board_encoding import NB_BOARDS, decode, encode
+from reachy_tictactoe.board_state import BoardState
+from reachy_tictactoe.utils import piece2id
+
+
+boards = decode(np.arange(NB_BOARDS))
+
+cube = piece2id['cube']
+cylinder = piece2id['cylinder']
+
+
+def test_code():
+    for board in boards:
+        state = BoardState.from_array(board)
+
+        assert state.code == encode(state.to_array())
+        assert np.array_equal(state.to_array(), board)
+        assert list(state) == list(board)
+
+
+def test_rules():
+    for board in boards[::11]:
+        state = BoardState.from_array(board)
+
+        assert rules.get_winner(state) == set_get_winner(board)
+        assert rules.is_final(state) == set_is_final(board)
+        assert rules.legal_moves(state) == [i for i in range(9) if board[i] == 0]
+
+
+def test_place():
+    empty = BoardState()
+    board = empty.place(4, cube).place(0, cylinder)
+
+    assert empty.is_empty()
+    assert board[4] == cube and board[0] == cylinder
+    assert board.nb_cubes == board.nb_cylinders == 1
+    assert board.is_coherent()
+
+    with pytest.raises(ValueError):
+        board.place(4, cylinder)
+
+
+def test_diff():
+    last = BoardState().place(0, cube).place(1, cylinder)
+    board = BoardState().place(0, cube).place(2, cube).place(3, cylinder)
+
+    assert board.diff(last) == (1 << 2, 1 << 3, 1 << 1)
+
+
+def test_valid_transitions():
+    last = BoardState().place(4, cube)
+
+    assert last.is_valid_transition(last, reachy_turn=False)
+    assert last.place(0, cube).is_valid_transition(last, reachy_turn=False)
+    assert last.place(0, cylinder).is_valid_transition(last, reachy_turn=True)
+    assert not last.place(0, cylinder).is_valid_transition(last, reachy_turn=False)
+    assert not last.place(0, cube).place(1, cube).is_valid_transition(last, reachy_turn=False)
+    assert not BoardState().is_valid_transition(last, reachy_turn=True)
+
+
+def test_immutable():
+    board = BoardState().place(4, cube)
+
+    with pytest.raises(AttributeError):
+        board.cubes = 0
+    assert board == BoardState.from_array(board.to_array())
+    assert hash(board) == hash(BoardState(cubes=1 << 4))
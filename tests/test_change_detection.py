@@ -0,0 +1,66 @@
+import numpy as np
+
+from reachy_tictactoe.change_detection import CHANGED, SETTLING, UNCHANGED, ChangeDetector
+
+
+rect = (0, 240, 0, 240)
+
+
+def frame(pieces=()):
+    img = np.full((240, 240, 3), 180, dtype=np.uint8)
+    for x, y in pieces:
+        img[y:y + 24, x:x + 24] = 40
+    return img
+
+
+def test_unchanged_once_accepted():
+    gate = ChangeDetector(rect)
+    empty = frame()
+
+    assert gate.update(empty, 0.0) == CHANGED
+    gate.accept(empty)
+    assert gate.update(empty, 0.1) == UNCHANGED
+    assert gate.changed_since is None
+
+
+def test_single_piece_settles():
+    gate = ChangeDetector(rect, settle_time=0.3)
+    gate.accept(frame())
+    gate.update(frame(), 0.0)
+
+    piece = frame([(100, 100)])
+    assert gate.update(piece, 0.2) == SETTLING
+    assert gate.update(piece, 0.4) == SETTLING
+    assert not gate.is_still(0.4)
+
+    assert gate.update(piece, 0.5) == CHANGED
+    assert gate.is_still(0.5)
+    assert gate.changed_since == 0.2
+
+    gate.accept(piece)
+    assert gate.update(piece, 0.6) == UNCHANGED
+
+
+def test_rejected_frame_is_retried():
+    gate = ChangeDetector(rect, retry_period=1.0)
+    hand = frame([(0, 120), (24, 120), (48, 120)])
+
+    gate.reject(hand, 0.0)
+    assert gate.update(hand, 0.5) == UNCHANGED
+    assert gate.update(hand, 1.0) == CHANGED
+    assert gate.changed_since == 1.0
+
+    gate.accept(hand)
+    assert gate.update(hand, 2.5) == UNCHANGED
+
+
+def test_stats():
+    gate = ChangeDetector(rect)
+    gate.update(frame(), 0.0)
+    gate.count(classified=True)
+    gate.update(frame(), 0.1)
+    gate.count(classified=False)
+
+    assert gate.stats == {'frames': 2, 'classifications': 1, 'skipped_classifications': 1}
+    gate.reset_stats()
+    assert gate.stats == {'frames': 0, 'classifications': 0, 'skipped_classifications': 0}
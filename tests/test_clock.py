@@ -0,0 +1,115 @@
+from threading import Event, Thread
+
+from reachy_tictactoe.clock import PhaseTimer, RealClock, VirtualClock
+
+
+def test_sleep_moves_the_time():
+    clock = VirtualClock(start=10.0)
+    clock.sleep(1.5, 'motion')
+    clock.sleep(-1.0, 'motion')
+
+    assert clock.time() == 11.5
+
+
+def test_sleeps_totalled_per_reason():
+    clock = VirtualClock()
+    clock.sleep(1.0, 'motion')
+    clock.sleep(0.5, 'camera')
+    clock.sleep(2.0, 'motion')
+    clock.sleep(0.1)
+
+    assert clock.stats == {'motion': 3.0, 'camera': 0.5, 'other': 0.1}
+    clock.reset_stats()
+    assert clock.stats == {}
+
+
+def test_background_sleeps_follow_the_time():
+    clock = VirtualClock()
+    running = Event()
+    running.set()
+
+    def loop():
+        while running.is_set():
+            clock.sleep(0.25, None)
+
+    t = Thread(target=loop)
+    clock.start(t)
+    clock.sleep(1.0, 'motion')
+    running.clear()
+    clock.join(t)
+
+    # Not totalled, and only moving the time while being joined.
+    assert clock.stats == {'motion': 1.0}
+    assert clock.time() <= 1.25
+
+
+def test_joined_thread_moves_the_time():
+    clock = VirtualClock()
+
+    def ears():
+        clock.sleep(2.5, None)
+        for _ in range(10):
+            clock.sleep(0.1, None)
+
+    t = Thread(target=ears)
+    clock.start(t)
+    clock.sleep(1.0, 'motion')
+    clock.join(t)
+
+    assert abs(clock.time() - 3.5) < 1e-9
+    assert clock.stats == {'motion': 1.0}
+
+
+def test_run_concurrently():
+    clock = VirtualClock()
+    clock.run_concurrently(
+        lambda: clock.sleep(1.0, 'motion'),
+        lambda: clock.sleep(2.0, 'camera'),
+    )
+
+    # The totals add up to the time spent.
+    assert clock.time() == 2.0
+    assert clock.stats == {'motion': 1.0, 'concurrent': 1.0}
+
+    clock.reset_stats()
+    clock.run_concurrently(
+        lambda: clock.sleep(3.0, 'motion'),
+        lambda: clock.sleep(2.0, 'camera'),
+    )
+    assert clock.time() == 5.0
+    assert clock.stats == {'motion': 3.0}
+
+
+def test_run_concurrently_threads():
+    clock = RealClock()
+    clock.run_concurrently(
+        lambda: clock.sleep(0.01, 'motion'),
+        lambda: clock.sleep(0.05, 'camera'),
+    )
+
+    assert set(clock.stats) == {'motion', 'concurrent'}
+    assert clock.stats['concurrent'] > 0.02
+
+
+def test_phase_timer():
+    clock = VirtualClock()
+    timer = PhaseTimer(clock)
+
+    with timer.phase('grab'):
+        clock.sleep(1.0, 'motion')
+
+    def place():
+        with timer.phase('place'):
+            clock.sleep(2.0, 'motion')
+
+    def verify():
+        with timer.phase('verify'):
+            clock.sleep(0.5, 'camera')
+
+    clock.run_concurrently(place, verify)
+
+    assert timer.summary() == {
+        'duration': 3.0,
+        'phases': {'grab': 1.0, 'place': 2.0, 'verify': 0.5},
+        'starts': {'grab': 0.0, 'place': 1.0, 'verify': 1.0},
+    }
@@ -0,0 +1,54 @@
+import numpy as np
+
+from reachy_tictactoe.fusion import BoardFusion
+
+
+def scores(labels, p=0.9):
+    probs = np.full((len(labels), 3), (1 - p) / 2)
+    probs[np.arange(len(labels)), labels] = p
+    return probs
+
+
+board = np.array([0, 1, 2, 0, 1, 0, 2, 0, 0])
+
+
+def test_board_reported_once_stable():
+    fusion = BoardFusion(min_frames=3)
+
+    assert fusion.update(scores(board)) is None
+    assert fusion.update(scores(board)) is None
+    assert np.array_equal(fusion.update(scores(board)), board)
+    assert fusion.nb_frames == 3
+
+
+def test_single_bad_frame_does_not_flip_a_cell():
+    fusion = BoardFusion(min_frames=3)
+    for _ in range(3):
+        fusion.update(scores(board))
+
+    wrong = board.copy()
+    wrong[0] = 2
+    fusion.update(scores(wrong, p=0.8))
+    assert np.array_equal(fusion.posterior.argmax(axis=1), board)
+
+    assert np.array_equal(fusion.update(scores(board)), board)
+
+
+def test_ambiguous_cell_is_not_reported():
+    fusion = BoardFusion(min_frames=3)
+    probs = scores(board)
+    probs[4] = (0.5, 0.5, 0.0)
+
+    for _ in range(8):
+        assert fusion.update(probs) is None
+
+
+def test_reset():
+    fusion = BoardFusion(min_frames=3)
+    for _ in range(3):
+        fusion.update(scores(board))
+
+    fusion.reset()
+    assert fusion.nb_frames == 0
+    assert np.allclose(fusion.posterior, 1 / 3)
+    assert fusion.update(scores(board)) is None
@@ -0,0 +1,23 @@
+import numpy as np
+
+from reachy_tictactoe import rules
+from reachy_tictactoe.benchmark import set_get_winner, set_is_final
+from reachy_tictactoe.board_encoding import NB_BOARDS, decode
+
+
+boards = decode(np.arange(NB_BOARDS))
+
+
+def test_get_winner():
+    for board in boards:
+        assert rules.get_winner(board) == set_get_winner(board)
+
+
+def test_is_final():
+    for board in boards:
+        assert rules.is_final(board) == set_is_final(board)
+
+
+def test_legal_moves():
+    for board in boards[::11]:
+        assert rules.legal_moves(board) == [i for i in range(9) if board[i] == 0]
@@ -0,0 +1,47 @@
+import os
+
+import numpy as np
+
+from reachy_tictactoe.snapshots import SnapshotRecorder
+
+
+img = np.zeros((48, 64, 3), dtype=np.uint8)
+
+
+def record(recorder, nb_snapshots):
+    recorder.start()
+    paths = [recorder.record(img) for _ in range(nb_snapshots)]
+    recorder.stop()
+    return paths
+
+
+def test_snapshots_written(tmp_path):
+    recorder = SnapshotRecorder(directory=str(tmp_path))
+    paths = record(recorder, 3)
+
+    assert [os.path.basename(p) for p in paths] == ['snap.000000.jpg', 'snap.000001.jpg', 'snap.000002.jpg']
+    assert all(os.path.exists(p) for p in paths)
+    assert recorder.stats['recorded'] == 3
+
+
+def test_disabled_without_directory():
+    recorder = SnapshotRecorder(directory=None)
+
+    assert record(recorder, 2) == [None, None]
+    assert recorder.stats['recorded'] == 0
+
+
+def test_numbering_goes_on_after_restart(tmp_path):
+    record(SnapshotRecorder(directory=str(tmp_path)), 2)
+    paths = record(SnapshotRecorder(directory=str(tmp_path)), 1)
+
+    assert os.path.basename(paths[0]) == 'snap.000002.jpg'
+    assert len(os.listdir(tmp_path)) == 3
+
+
+def test_oldest_snapshots_removed(tmp_path):
+    recorder = SnapshotRecorder(directory=str(tmp_path), max_files=2)
+    record(recorder, 4)
+
+    assert sorted(os.listdir(tmp_path)) == ['snap.000002.jpg', 'snap.000003.jpg']
+    assert recorder.stats['removed'] == 2
@@ -0,0 +1,21 @@
+import numpy as np
+
+from reachy_tictactoe.board_encoding import encode
+from reachy_tictactoe.solver import POLICY, VALUE, load_table, solve
+
+
+def test_shipped_table_is_up_to_date():
+    # The table shipped with the package is the one solve() computes.
+    assert np.array_equal(solve(), load_table())
+
+
+def test_empty_board_is_a_draw():
+    table = load_table()
+
+    for player in (1, 2):
+        action = table[player - 1, POLICY, 0]
+        assert 0 <= action < 9
+
+        board = [0] * 9
+        board[action] = player
+        assert table[player - 1, VALUE, encode(board)] == 0
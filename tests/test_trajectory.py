@@ -0,0 +1,47 @@
+import numpy as np
+
+from reachy_tictactoe.trajectory import TrajectoryComposer
+
+
+start = {'shoulder': 0.0, 'elbow': 0.0, 'gripper': 20.0}
+
+
+def test_target_reached_exactly():
+    composer = TrajectoryComposer(start, freq=100)
+    composer.goto({'shoulder': 10.0, 'elbow': -30.0}, 1.0)
+    composer.goto({'shoulder': 40.0}, 1.0)
+    trajectory = composer.compose()
+
+    assert trajectory['shoulder'][-1] == 40.0
+    assert trajectory['elbow'][-1] == -30.0
+    assert np.all(trajectory['gripper'] == 20.0)
+
+
+def test_blended_and_continuous():
+    composer = TrajectoryComposer(start, freq=100, blend=0.4)
+    composer.goto({'shoulder': 10.0}, 1.0)
+    composer.goto({'shoulder': 0.0}, 1.0)
+    shoulder = composer.compose()['shoulder']
+
+    # The segments overlap, and the arm turns back without stopping.
+    assert len(shoulder) - 1 < composer.nominal_duration * composer.freq
+    assert shoulder.max() < 10.0
+    assert np.abs(np.diff(shoulder)).max() < 0.3
+    assert np.abs(np.diff(shoulder, n=2)).max() < 0.02
+
+
+def test_play_relative_to_the_previous_segments():
+    composer = TrajectoryComposer(start, freq=100)
+    composer.goto({'shoulder': 5.0}, 0.5)
+    composer.play({'shoulder': np.array([1.0, 2.0, 3.0])})
+    trajectory = composer.compose()
+
+    assert np.allclose(trajectory['shoulder'][-3:], [5.0, 6.0, 7.0])
+    assert np.all(trajectory['elbow'] == 0.0)
+
+
+def test_motors_subset():
+    composer = TrajectoryComposer(start, motors=['shoulder', 'elbow'], freq=100)
+    composer.goto({'shoulder': 10.0, 'gripper': 0.0}, 0.5)
+
+    assert sorted(composer.compose()) == ['elbow', 'shoulder']